@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""Benchmark the cold start time of the score readers."""
+
+# This file is part of the healthcheck package.
+#
+# The healthcheck package is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# The healthcheck package is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# the healthcheck package.  If not, see <http://www.gnu.org/licenses/>.
+
+# Run from the root of the repository:
+#   python3 benchmarks/cold_start.py [RUNS]
+
+# Standard library imports
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COMMANDS = {
+    "score_reader": [sys.executable, "-m", "healthcheck.score_reader"],
+    "client.py": [
+        sys.executable,
+        "-c",
+        "import client; print(client.Client().get_score())",
+    ],
+    "python (empty)": [sys.executable, "-c", "pass"],
+}
+
+
+def bench(command, runs):
+    """Run a command several times, and return the durations (or None)."""
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        process = subprocess.run(
+            command,
+            cwd=ROOT,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            check=False,
+        )
+        durations.append(time.perf_counter() - start)
+        # client.py fails if dbus is not installed or the daemon isn't
+        # running
+        if process.returncode and command is COMMANDS["client.py"]:
+            return None
+    return durations
+
+
+def main():
+    """Print the cold start time of each reader."""
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    print(f"{'command':<16} {'min (ms)':>10} {'median (ms)':>12}")
+    for name, command in COMMANDS.items():
+        durations = bench(command, runs)
+        if durations is None:
+            print(f"{name:<16} {'unavailable':>23}")
+            continue
+        print(f"{name:<16} {min(durations) * 1000:>10.1f} "
+              f"{statistics.median(durations) * 1000:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
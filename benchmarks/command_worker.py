@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""Benchmark the runs per second of the command check engines."""
+
+# This file is part of the healthcheck package.
+#
+# The healthcheck package is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# The healthcheck package is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# the healthcheck package.  If not, see <http://www.gnu.org/licenses/>.
+
+
+# Run from the root of the repository:
+#   python3 benchmarks/command_worker.py [SECONDS]
+
+# Standard library imports
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import healthcheck modules
+import healthcheck.command_worker  # noqa: E402
+import healthcheck.tests.command  # noqa: E402
+
+TESTS = {
+    "echo": ("echo 1", False),
+    "shell": ("echo 1 | cat", False),
+    "python": ("result = 1", True),
+}
+
+
+def bench(function, duration):
+    """Get the number of calls of a function per second."""
+    runs = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration:
+        assert function() == 1
+        runs += 1
+    return runs / (time.perf_counter() - start)
+
+
+def main():
+    """Print the runs per second of each engine."""
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 2
+    worker = healthcheck.command_worker.start()
+    print(f"{'test':<8} {'blocking (runs/s)':>18} {'worker (runs/s)':>16}")
+    for name, (command, python) in TESTS.items():
+        test = healthcheck.tests.command.Test(name, command, "C",
+                                              python=python, timeout=10)
+        blocking = bench(test.run, duration)
+        in_worker = bench(lambda: test.run_worker(worker, 10), duration)
+        print(f"{name:<8} {blocking:>18.0f} {in_worker:>16.0f}")
+    healthcheck.command_worker.stop()
+
+
+if __name__ == "__main__":
+    main()
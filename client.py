@@ -49,6 +49,14 @@ class Client():
             "get_score",
             f"{BUS_NAME}.Score"
         )
+        self.get_failed = service.get_dbus_method(
+            "get_failed",
+            f"{BUS_NAME}.Score"
+        )
+        self.get_snapshot = service.get_dbus_method(
+            "GetSnapshot",
+            f"{BUS_NAME}.Snapshot"
+        )
         self.get_config = service.get_dbus_method(
             "get_config",
             f"{BUS_NAME}.Config"
@@ -69,6 +77,10 @@ class Client():
         self.run_all()
         self.run_check("disk")
         self.run_needed()
+        print("Failed checks:")
+        print(self.get_failed())
+        print("Snapshot:")
+        print(self.get_snapshot())
         print("Config:")
         print(self.get_config("disk"))
         print(self.get_config("."))
@@ -0,0 +1,72 @@
+"""Health Check - A simple health check script for your server."""
+
+# This file is part of the healthcheck package.
+#
+# The healthcheck package is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# The healthcheck package is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# the healthcheck package.  If not, see <http://www.gnu.org/licenses/>.
+
+# Standard library imports
+import logging
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Log the loading of the adaptive module
+logger.debug("Loading module: %s from %s", __name__, __file__)
+
+
+def _severity(value, config):
+    """Get how bad a value is, as a percentage of the check range."""
+    # Get the value percentage (like in the score calculation)
+    percentage = (value - config["min"]) / (config["max"] - config["min"]) \
+        * 100
+    percentage = max(0, min(100, percentage))
+
+    # Higher is worse
+    if not config["lower_is_better"]:
+        percentage = 100 - percentage
+    return percentage
+
+
+def next_interval(interval, previous, value, config):
+    """Get the next check interval of an adaptive check.
+
+    The interval is stretched (by adaptive_factor) toward max_check_interval
+    while the value stays in a band (adaptive_band, in percent of the check
+    range) around the previous value. It's shrunk toward min_check_interval
+    when the value moves toward the warning threshold (in percent of the
+    check range too), and set to min_check_interval once the value reaches
+    it.
+    """
+    minimum = config["min_check_interval"]
+    maximum = config["max_check_interval"]
+    factor = config["adaptive_factor"]
+
+    # Sample as often as possible once the value is bad
+    severity = _severity(value, config)
+    if severity >= config["warning"]:
+        return minimum
+
+    # Keep the interval until there are two values to compare
+    if previous is None:
+        return max(minimum, min(maximum, interval))
+
+    change = severity - _severity(previous, config)
+    if abs(change) <= config["adaptive_band"]:
+        # The value is stable, sample less often
+        interval *= factor
+    elif change > 0:
+        # The value moves toward the warning threshold, sample more often
+        interval /= factor
+
+    return max(minimum, min(maximum, interval))
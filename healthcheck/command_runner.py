@@ -0,0 +1,89 @@
+"""Health Check - A simple health check script for your server."""
+
+# This file is part of the healthcheck package.
+#
+# The healthcheck package is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# The healthcheck package is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# the healthcheck package.  If not, see <http://www.gnu.org/licenses/>.
+
+# Standard library imports
+import logging
+import asyncio
+import time
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Log the loading of the command_runner module
+logger.debug("Loading module: %s from %s", __name__, __file__)
+
+
+async def _run_command(name, test, timeout, semaphore):
+    """Run a command test once a slot is free (returns its duration)."""
+    async with semaphore:
+        start = time.monotonic()
+        try:
+            result = await test.run_async(timeout)
+        except Exception:
+            logger.exception("Error running test: %s", name)
+            result = False
+        return name, (result, time.monotonic() - start)
+
+
+async def _run_commands(tests, timeouts, max_concurrency, deadline):
+    """Run the command tests concurrently (until the deadline, if any)."""
+    # Limit the number of commands running at the same time
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    # Start all the commands, and wait for them
+    tasks = [
+        asyncio.create_task(
+            _run_command(name, test, timeouts[name], semaphore)
+        )
+        for name, test in tests.items()
+    ]
+    done, pending = await asyncio.wait(
+        tasks,
+        timeout=None if deadline is None else max(0, deadline - time.time()),
+    )
+
+    # Cancel the commands that are still running (or waiting for a slot) at
+    # the deadline, they kill their process
+    if pending:
+        logger.warning("Commands not done before the deadline: %s",
+                       ", ".join(
+                           name for name, task in zip(tests, tasks)
+                           if task in pending
+                       ))
+        for task in pending:
+            task.cancel()
+        await asyncio.wait(pending)
+
+    # Return the results of the commands that are done
+    return dict(task.result() for task in done)
+
+
+def run(tests, timeouts, max_concurrency, deadline=None):
+    """Run command tests concurrently (results are keyed by test name).
+
+    Like the other tests run by the test manager, the results are returned
+    with the test instances (in case they were run in another process) and
+    the durations of the tests. The tests that aren't done at the deadline
+    (a time.time() timestamp) are stopped, and left out of the results.
+    """
+    results = asyncio.run(
+        _run_commands(tests, timeouts, max_concurrency, deadline)
+    )
+    return {
+        name: (result, tests[name], duration)
+        for name, (result, duration) in results.items()
+    }
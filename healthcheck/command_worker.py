@@ -0,0 +1,447 @@
+"""Health Check - A simple health check script for your server."""
+
+# This file is part of the healthcheck package.
+#
+# The healthcheck package is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# The healthcheck package is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# the healthcheck package.  If not, see <http://www.gnu.org/licenses/>.
+
+# The command worker is a long-lived helper process that runs the command
+# checks for the daemon. It's forked early (before D-Bus, GLib and the tests
+# are loaded), so forking it is cheap, and it avoids the shell when the
+# command doesn't need it. It also runs the checks written as Python
+# snippets, reusing their compiled code and their variables between runs.
+#
+# The snippets run in snippet hosts: a Python process per check, that keeps
+# the compiled snippet and its variables. A snippet that times out can't be
+# interrupted in a thread, so its host is killed (and started again on the
+# next run).
+
+# Standard library imports
+import concurrent.futures
+import heapq
+import itertools
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Log the loading of the command_worker module
+logger.debug("Loading module: %s from %s", __name__, __file__)
+
+# Characters that need a shell to run the command (else, the command is
+# split on whitespace and executed directly)
+SHELL_CHARACTERS = frozenset("|&;<>()$`\\\"'*?[]#~=%{}!\n")
+
+# Time given to the worker to kill a command that timed out
+KILL_DELAY = 1
+
+# Number of requests run at the same time by the worker
+WORKER_THREADS = 32
+
+# Directories searched for the commands executed without a shell (the
+# commands only get the language in their environment)
+COMMAND_PATH = os.environ.get("PATH") or \
+    "/usr/local/sbin:/usr/local/bin:/usr/sbin:/usr/bin:/sbin:/bin"
+
+# Directory of the healthcheck package (for the snippet hosts)
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The worker of this process (see start and get)
+_worker = None
+
+# The snippet hosts of this process, when the worker isn't used (see
+# run_snippet)
+_snippets = None
+_snippets_lock = threading.Lock()
+
+
+def run_python(code, namespace):
+    """Run a compiled Python snippet, and return its result as a string.
+
+    The snippet sets its result in the result variable, the namespace is
+    kept between runs (so snippets can keep state).
+    """
+    exec(code, namespace)
+    return str(namespace.get("result", ""))
+
+
+def _serve_snippets(connection):
+    """Run the Python snippets of a check (in a snippet host)."""
+    # Compiled snippet and its variables (reset when the snippet changes)
+    code = None
+    namespace = {}
+    while True:
+        try:
+            name, source = connection.recv()
+        except (EOFError, OSError):
+            break
+        try:
+            if code is None or code[0] != source:
+                code = (source, compile(source, name, "exec"))
+                namespace = {}
+            reply = ("ok", run_python(code[1], namespace))
+        except Exception as error:
+            reply = ("exception", repr(error))
+        connection.send(reply)
+
+
+class _SnippetHost:
+    """Process that runs the Python snippets of a check.
+
+    It's started with subprocess (not forked), so it doesn't inherit the
+    threads and the state of the daemon or of the worker.
+    """
+
+    def __init__(self):
+        """Start the snippet host."""
+        self._connection, child_connection = multiprocessing.Pipe()
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(
+            filter(None, (PACKAGE_ROOT, env.get("PYTHONPATH")))
+        )
+        self._process = subprocess.Popen(
+            [sys.executable, "-m", __name__,
+             str(child_connection.fileno())],
+            stdin=subprocess.DEVNULL,
+            pass_fds=(child_connection.fileno(),),
+            env=env,
+        )
+        child_connection.close()
+
+        # A host runs one snippet at a time
+        self.lock = threading.Lock()
+
+    def is_alive(self):
+        """Check if the snippet host is running."""
+        return self._process.poll() is None
+
+    def run(self, name, source, timeout):
+        """Run a snippet, and return (status, output) (see Worker.run).
+
+        A timeout of None waits for the snippet without limit.
+        """
+        try:
+            self._connection.send((name, source))
+            # poll(None) blocks until the reply is received
+            if self._connection.poll(timeout):
+                return self._connection.recv()
+        except (EOFError, OSError):
+            self.kill()
+            return "exception", "Snippet host stopped"
+
+        # The snippet timed out, kill its host (the snippet can't be
+        # stopped otherwise)
+        self.kill()
+        return "timeout", ""
+
+    def kill(self):
+        """Stop the snippet host."""
+        self._connection.close()
+        self._process.kill()
+        self._process.wait()
+
+
+class Snippets:
+    """The snippet hosts of the Python checks, by check name."""
+
+    def __init__(self):
+        """Initialize the snippet hosts."""
+        # The hosts can only be used from the process that started them
+        self.pid = os.getpid()
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def run(self, name, source, timeout):
+        """Run the snippet of a check, and return (status, output)."""
+        with self._lock:
+            host = self._hosts.get(name)
+            if host is None or not host.is_alive():
+                host = self._hosts[name] = _SnippetHost()
+        with host.lock:
+            status, output = host.run(name, source, timeout)
+        if not host.is_alive():
+            logger.debug("Snippet host of %s stopped (%s), its variables are "
+                         "lost", name, status)
+        return status, output
+
+    def close(self):
+        """Stop the snippet hosts."""
+        with self._lock:
+            for host in self._hosts.values():
+                if host.is_alive():
+                    host.kill()
+            self._hosts.clear()
+
+
+class _Watchdog(threading.Thread):
+    """Thread that kills the commands that run for too long.
+
+    Waiting for a command with a timeout (communicate(timeout=...)) polls the
+    pipes with a selector, which is much slower than a plain read, so the
+    commands are read without timeout, and this thread kills them at their
+    deadline instead.
+    """
+
+    def __init__(self):
+        """Initialize the watchdog."""
+        super().__init__(name="worker-watchdog", daemon=True)
+        # Heap of [deadline, sequence, process, shell, timed out] entries
+        self._heap = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+
+    def watch(self, process, shell, timeout):
+        """Watch a process, and return its entry (see timed_out)."""
+        entry = [time.monotonic() + timeout, next(self._counter), process,
+                 shell, False]
+        with self._condition:
+            heapq.heappush(self._heap, entry)
+            self._condition.notify()
+        return entry
+
+    def run(self):
+        """Kill the processes whose deadline has passed."""
+        with self._condition:
+            while True:
+                if not self._heap:
+                    self._condition.wait()
+                    continue
+                entry = self._heap[0]
+                delay = entry[0] - time.monotonic()
+                if delay > 0:
+                    self._condition.wait(delay)
+                    continue
+                heapq.heappop(self._heap)
+                _, _, process, shell, _ = entry
+                if process.poll() is not None:
+                    continue
+                entry[-1] = True
+                try:
+                    if shell:
+                        os.killpg(process.pid, signal.SIGKILL)
+                    else:
+                        process.kill()
+                except ProcessLookupError:
+                    pass
+
+
+def _run_command(command, language, timeout, watchdog):
+    """Run a command, and return its status and output."""
+    # Commands that need a shell run in their own session, so we can kill
+    # the whole process group (the shell and its children) on timeout. The
+    # other ones are executed directly, without a new session (which would
+    # prevent subprocess from using vfork).
+    shell = not SHELL_CHARACTERS.isdisjoint(command)
+    process = subprocess.Popen(
+        command if shell else command.split(),
+        shell=shell,
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+        env={"LANG": language, "PATH": COMMAND_PATH},
+        start_new_session=shell,
+    )
+    entry = None
+    if timeout is not None:
+        entry = watchdog.watch(process, shell, timeout)
+    output, _ = process.communicate()
+    if entry is not None and entry[-1]:
+        return "timeout", ""
+
+    if process.returncode:
+        return "error", f"{process.returncode}: {output}"
+    return "ok", output
+
+
+def _serve(connection):
+    """Run the requests of the daemon (in the worker process)."""
+    # Snippet hosts of the Python checks
+    snippets = Snippets()
+
+    # Replies are sent from several threads
+    lock = threading.Lock()
+
+    # Kill the commands that time out
+    watchdog = _Watchdog()
+    watchdog.start()
+
+    def handle(request_id, kind, name, source, language, timeout):
+        """Run a request, and send its result."""
+        try:
+            if kind == "python":
+                reply = snippets.run(name, source, timeout)
+            else:
+                reply = _run_command(source, language, timeout, watchdog)
+        except Exception as error:
+            reply = ("exception", repr(error))
+        with lock:
+            connection.send((request_id, *reply))
+
+    # Run the requests in threads (commands wait for their process)
+    with concurrent.futures.ThreadPoolExecutor(WORKER_THREADS) as executor:
+        while True:
+            try:
+                request = connection.recv()
+            except (EOFError, OSError):
+                break
+            # None asks the worker to stop (see Worker.close)
+            if request is None:
+                break
+            executor.submit(handle, *request)
+    snippets.close()
+
+
+class Worker:
+    """Client of the command worker process."""
+
+    def __init__(self):
+        """Fork the worker process."""
+        context = multiprocessing.get_context("fork")
+        self._connection, child_connection = context.Pipe()
+        self._process = context.Process(
+            target=_serve,
+            args=(child_connection,),
+            name="healthcheck-worker",
+            daemon=True,
+        )
+        self._process.start()
+        child_connection.close()
+
+        # The worker can only be used from the process that started it
+        self.pid = os.getpid()
+
+        # Pending requests, by request ID
+        self._futures = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+        # Receive the replies in a thread
+        self._receiver = threading.Thread(target=self._receive,
+                                          name="worker-receiver", daemon=True)
+        self._receiver.start()
+        logger.info("Command worker started: %s", self._process.pid)
+
+    def _receive(self):
+        """Set the results of the requests (in a thread)."""
+        while True:
+            try:
+                request_id, status, output = self._connection.recv()
+            except (EOFError, OSError):
+                break
+            if future := self._futures.pop(request_id, None):
+                future.set_result((status, output))
+
+        # The connection is only closed by this thread, so its file
+        # descriptor can't be reused by another file while it's read
+        self._connection.close()
+
+        # The worker stopped, fail the pending requests
+        logger.warning("Command worker stopped")
+        for future in list(self._futures.values()):
+            future.set_result(("exception", "Command worker stopped"))
+        self._futures.clear()
+
+    def is_alive(self):
+        """Check if the worker is running (and usable by this process)."""
+        return os.getpid() == self.pid and self._process.is_alive()
+
+    def run(self, kind, name, source, language, timeout):
+        """Run a command or a Python snippet, and return (status, output).
+
+        The status is "ok", "error" (non-zero exit code), "timeout" or
+        "exception". A timeout of None waits for the command without limit.
+        """
+        future = concurrent.futures.Future()
+        request_id = next(self._ids)
+        self._futures[request_id] = future
+        with self._lock:
+            self._connection.send(
+                (request_id, kind, name, source, language, timeout)
+            )
+        try:
+            return future.result(
+                None if timeout is None else timeout + KILL_DELAY
+            )
+        except concurrent.futures.TimeoutError:
+            self._futures.pop(request_id, None)
+            return "timeout", ""
+
+    def close(self):
+        """Stop the worker."""
+        # Ask the worker to stop, the receiver stops when the worker exits
+        with self._lock:
+            try:
+                self._connection.send(None)
+            except OSError:
+                pass
+        self._process.join(KILL_DELAY)
+        if self._process.is_alive():
+            self._process.kill()
+            self._process.join()
+        self._receiver.join(KILL_DELAY)
+
+
+def start():
+    """Start the command worker of this process."""
+    global _worker
+    if _worker is None or not _worker.is_alive():
+        _worker = Worker()
+    return _worker
+
+
+def get():
+    """Get the command worker of this process (None if not running)."""
+    if _worker is not None and _worker.is_alive():
+        return _worker
+    return None
+
+
+def run_snippet(name, source, timeout):
+    """Run the snippet of a check, and return (status, output).
+
+    The snippet is run by the command worker if it's running, else by a
+    snippet host of this process.
+    """
+    if (worker := get()) is not None:
+        return worker.run("python", name, source, "", timeout)
+
+    global _snippets
+    with _snippets_lock:
+        if _snippets is None or _snippets.pid != os.getpid():
+            _snippets = Snippets()
+    return _snippets.run(name, source, timeout)
+
+
+def stop():
+    """Stop the command worker (and the snippet hosts) of this process."""
+    global _worker, _snippets
+    if _worker is not None:
+        _worker.close()
+        _worker = None
+    with _snippets_lock:
+        if _snippets is not None and _snippets.pid == os.getpid():
+            _snippets.close()
+        _snippets = None
+
+
+if __name__ == "__main__":
+    # Snippet host (see _SnippetHost), the connection is given by its file
+    # descriptor
+    _serve_snippets(multiprocessing.connection.Connection(int(sys.argv[1])))
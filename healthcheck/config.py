@@ -34,6 +34,19 @@ DEFAULT_CONFIG = {
         "coeff": 1,
         "check_interval": 10,
         "check_timeout": 10,
+        # A failed check is retried after check_interval, then the interval
+        # is multiplied by retry_backoff after each failure, up to
+        # retry_backoff_max seconds
+        "retry_backoff": 2.0,
+        "retry_backoff_max": 600,
+        # Adaptive checks run less often while their value is stable, and
+        # more often when it moves toward the warning threshold (see
+        # healthcheck.adaptive)
+        "adaptive": False,
+        "min_check_interval": 5.0,
+        "max_check_interval": 120.0,
+        "adaptive_band": 2.0,
+        "adaptive_factor": 1.5,
         "min": 0,
         "max": 100,
         "lower_is_better": True,
@@ -51,7 +64,73 @@ DEFAULT_CONFIG = {
         "extreme": 100,
         # For the "command" check
         "command_run_language": "C",
+        # Read the output of the command line by line, and stop it once the
+        # regex chain matches a line
+        "stream_output": False,
+        # For the checks with several metrics (like the command checks whose
+        # last regex has named groups): config of the metrics, as
+        # {pattern: config}, applied in order over the check config
+        "metrics": {},
         "ignore_if_up_average": False,
+        # For the "cpu" check: keep a sliding window of CPU samples in a
+        # background thread (else, the load since the previous run is
+        # returned)
+        "cpu_sampler": False,
+        "cpu_sample_interval": 1.0,
+        "cpu_sample_window": 10,
+        # For the "disk_io" check: use the busiest disk instead of the total
+        # of all the disks
+        "perdisk": False,
+        # For the "disk_usage" check: check all the mounts (found in
+        # /proc/self/mountinfo) instead of disk_test_path, except the
+        # excluded filesystem types and mount points (glob patterns). The
+        # check returns the "<mount>" and "<mount>:inodes" usages of each
+        # mount, and the "worst" of them
+        "disk_mounts": False,
+        "disk_exclude_fstypes": [
+            "autofs", "binfmt_misc", "bpf", "cgroup", "cgroup2", "configfs",
+            "debugfs", "devpts", "devtmpfs", "efivarfs", "fusectl",
+            "hugetlbfs", "mqueue", "nsfs", "proc", "pstore", "securityfs",
+            "squashfs", "sysfs", "tracefs",
+        ],
+        "disk_exclude_mounts": ["/proc/*", "/sys/*", "/dev/*", "/run/*"],
+        # For the "processes" check: "processes", "zombies" or "threads"
+        "processes_metric": "processes",
+        # For the "users" check: "max_processes" (number of processes of the
+        # user that has the most) or "users" (number of users with processes)
+        "users_metric": "max_processes",
+        # For the "pressure" checks: resource ("cpu", "memory" or "io"), kind
+        # of stall ("some" or "full") and average ("avg10", "avg60" or
+        # "avg300") of the pressure stall information. The daemon registers
+        # a PSI trigger (stalls of pressure_threshold microseconds in a
+        # window of pressure_window microseconds) and runs the check when
+        # it fires, instead of polling it. Unprivileged processes can only
+        # use windows that are multiples of 2 seconds
+        "pressure_resource": "cpu",
+        "pressure_kind": "some",
+        "pressure_metric": "avg10",
+        "pressure_threshold": 150000,
+        "pressure_window": 2000000,
+        # For the "cgroup" check: cgroups to check (cgroup v2), relative to
+        # the cgroup root, with glob patterns ("." is the cgroup of the
+        # daemon). The check returns the "<path>:memory", "<path>:cpu" and
+        # "<path>:io" metrics of each cgroup
+        "cgroup_root": "/sys/fs/cgroup",
+        "cgroup_paths": ["."],
+        # For the "logtail" check: log files to read, patterns of the lines
+        # to count, and window (in seconds) of the count. The offsets in the
+        # files are saved in log_state_file (a file in
+        # $XDG_STATE_HOME/healthcheck if empty)
+        "log_files": [],
+        "log_patterns": ["error"],
+        "log_window": 300,
+        "log_state_file": "",
+        # For the "endpoint" check: endpoints to probe ("tcp://host:port" or
+        # "http(s)://host:port/path"), and timeout in seconds. The check
+        # returns the latency of each endpoint in milliseconds (the timeout
+        # if it failed)
+        "endpoints": [],
+        "endpoint_timeout": 5.0,
     },
     # Here we define the checks settings (command and regex, or type for
     # special checks)
@@ -66,7 +145,6 @@ DEFAULT_CONFIG = {
         "cpu": {
             "type": "cpu",
             "coeff": 2,
-            "cpu_test_duration": 1,
         },
         "ram": {
             "type": "ram",
@@ -83,6 +161,47 @@ DEFAULT_CONFIG = {
             "coeff": 2,
             "ignore_if_up_average": True,
             "compare_interval": 60,
+            # Throughput in bytes per second (100 MiB/s)
+            "max": 104857600,
+        },
+        "users": {
+            "type": "users",
+            "coeff": 1,
+            "max": 1000,
+            "ignore_if_up_average": True,
+        },
+        "processes": {
+            "type": "processes",
+            "coeff": 1,
+            "max": 2000,
+            "ignore_if_up_average": True,
+        },
+        # Pressure stall information (Linux 4.20+), not performed by default
+        "cpu_pressure": {
+            "type": "pressure",
+            "coeff": 1,
+            "pressure_resource": "cpu",
+        },
+        "memory_pressure": {
+            "type": "pressure",
+            "coeff": 2,
+            "pressure_resource": "memory",
+        },
+        "io_pressure": {
+            "type": "pressure",
+            "coeff": 1,
+            "pressure_resource": "io",
+        },
+        # Resources of cgroups (containers, systemd slices), not performed by
+        # default
+        "cgroups": {
+            "type": "cgroup",
+            "coeff": 1,
+            "cgroup_paths": ["."],
+            "metrics": {
+                # Throughput in bytes per second (100 MiB/s)
+                "*:io": {"max": 104857600},
+            },
         },
     },
     # Here we define the checks to be performed
@@ -102,10 +221,59 @@ DEFAULT_CONFIG = {
             "min": 0,
             "max": 100,
         },
+        # Spread the runs of the checks over their check interval, with a
+        # phase computed from the seed (the host name if empty) and the check
+        # name (retries and adaptive intervals stay on the same grid)
+        "scheduler": {
+            "spread": True,
+            "seed": "",
+        },
+        # Pool that runs the checks in parallel ("thread" or "process")
+        "workers": {
+            "type": "thread",
+            "max_workers": 8,
+        },
+        # Engine that runs the command checks ("async" runs them together in
+        # an event loop, "blocking" runs them one by one in the workers,
+        # "worker" runs them in a long-lived helper process forked at start)
+        "commands": {
+            "engine": "async",
+            "max_concurrency": 16,
+        },
+        # Minimum change of a value before the ScoreChanged and CheckResult
+        # D-Bus signals are emitted again
+        "signals": {
+            "score_delta": 1.0,
+            "check_delta": 1.0,
+        },
+        # Memory-mapped file where the scores are published, for readers
+        # that don't want to use D-Bus (default path: in $XDG_RUNTIME_DIR)
+        "publish": {
+            "enabled": True,
+            "path": "",
+            "capacity": 64,
+        },
+        # History of the results, kept in a fixed-size ring buffer per check
+        # (default path: in $XDG_STATE_HOME)
+        "history": {
+            "enabled": True,
+            "path": "",
+            "capacity": 2160,
+            "max_checks": 32,
+            # Rollups (min/max/mean/last of the results) as [resolution in
+            # seconds, number of buckets] pairs: 1 day of 5 minutes buckets
+            # and 30 days of 1 hour buckets
+            "rollups": [[300, 288], [3600, 720]],
+        },
     }
 }
 
 
+def _is_number(value):
+    """Check if a value is a number (booleans aren't)."""
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
 def replace_default_config(config, default_config):
     """Add default values to the configuration (Recursive)."""
     # Iterate over the configuration
@@ -114,9 +282,11 @@ def replace_default_config(config, default_config):
         if key not in config:
             config[key] = value
 
-        # Check if the type of the value is the same as the default value, and
-        # if not, replace it and print a warning
-        elif not isinstance(config[key], type(value)):
+        # Check if the type of the value is the same as the default value
+        # (integers are valid floats), and if not, replace it and print a
+        # warning
+        elif not isinstance(config[key], type(value)) and \
+                not (isinstance(value, float) and _is_number(config[key])):
             logger.warning(
                 "The value of the key '%s' is not valid, replacing it with the"
                 " default value.", key
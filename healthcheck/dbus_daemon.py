@@ -18,6 +18,8 @@
 # Standard library imports
 import logging
 import json
+import math
+import time
 
 # Import dbus and gobject
 import dbus
@@ -34,6 +36,7 @@ except ImportError:
 # Import healthcheck modules
 import healthcheck.test_manager
 import healthcheck.config
+import healthcheck.publish
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -67,8 +70,12 @@ class Service(dbus.service.Object):
         # Initialize the gobject loop
         self._loop = gobject.MainLoop()
 
-        # Add the run_needed method to the gobject loop
-        gobject.idle_add(self._test_manager.run_needed)
+        # Create the timer source (armed for the nearest check deadline)
+        self._timer = None
+
+        # Create the watch sources of the event-driven checks, as
+        # {check name: (file descriptor, source)}
+        self._watches = {}
 
         # Save the config
         self._config = config
@@ -76,56 +83,247 @@ class Service(dbus.service.Object):
         # Initialize the score
         self._score = None
 
+        # Initialize the values sent by the last signals (to only emit a
+        # signal when the value changed enough)
+        self._signaled_score = None
+        self._signaled_checks = {}
+
+        # Initialize the snapshot cache, as (results version, snapshot)
+        self._snapshot = (None, None)
+
+        # Initialize the shared memory publisher
+        self._publisher = None
+        publish_config = config["global"]["publish"]
+        if publish_config["enabled"]:
+            try:
+                self._publisher = healthcheck.publish.Publisher(
+                    publish_config["path"] or None,
+                    publish_config["capacity"],
+                )
+            except OSError as error:
+                logger.warning("Not publishing the scores: %s", error)
+
     def run(self):
         """Run the DBus service."""
         # Log the starting of the DBus service
         logger.debug("Starting DBus service")
 
-        # Run the checks
-        self._score = self._test_manager.run_all()
+        # Start the checks (their results are added while the loop runs)
+        self._test_manager.start_checks(
+            self._test_manager.config["checks_to_perform"],
+            self._defer,
+        )
+
+        # Wait for the next check deadline, and for the events
+        self._arm_timer()
+        self._update_watches()
+        self._emit_changes()
 
         # Log the start of the DBus service
         logger.info("DBus service started")
         self._loop.run()
+
+        # Stop the workers
+        self._test_manager.close()
+
+        # Remove the published scores
+        if self._publisher is not None:
+            self._publisher.close()
         logger.info("DBus service stopped")
 
+    def _arm_timer(self):
+        """Arm the timer for the nearest check deadline."""
+        # Remove the previous timer (the deadline may have changed)
+        if self._timer is not None:
+            gobject.source_remove(self._timer)
+            self._timer = None
+
+        # Get the nearest deadline (None if nothing is scheduled)
+        run_at = self._test_manager.next_run_at()
+        if run_at is None:
+            logger.debug("No check scheduled, timer not armed")
+            return
+
+        # Sleep until the deadline (rounded up, so we don't wake up early)
+        delay = max(0, math.ceil((run_at - time.time()) * 1000))
+        self._timer = gobject.timeout_add(delay, self._on_timer)
+
+    def _on_timer(self):
+        """Run the checks that are due and wait for the next deadline."""
+        # The timer is a one-shot source (we return False)
+        self._timer = None
+
+        # Start the due checks
+        self._test_manager.start_needed(self._defer)
+        self._reload_score()
+
+        # Wait for the next deadline
+        self._arm_timer()
+        self._emit_changes()
+        return False
+
+    def _update_watches(self):
+        """Watch the file descriptors of the event-driven checks."""
+        watches = self._test_manager.watches()
+
+        # Remove the watches of the checks that changed (or were disabled)
+        for check_name, (fd, source) in list(self._watches.items()):
+            if watches.get(check_name) != fd:
+                gobject.source_remove(source)
+                del self._watches[check_name]
+
+        # Watch the new file descriptors (POLLPRI for the events, and
+        # POLLERR if the watch is broken)
+        for check_name, fd in watches.items():
+            if check_name not in self._watches:
+                source = gobject.io_add_watch(
+                    fd,
+                    gobject.IO_PRI | gobject.IO_ERR,
+                    self._on_event,
+                    check_name,
+                )
+                self._watches[check_name] = (fd, source)
+
+    def _on_event(self, fd, condition, check_name):
+        """Run an event-driven check when its file descriptor is ready."""
+        error = bool(condition & gobject.IO_ERR)
+        if error:
+            # The check is polled from now on
+            del self._watches[check_name]
+        self._score = self._test_manager.on_event(check_name, error,
+                                                  self._defer)
+
+        # The check may have been scheduled (for its follow-up runs)
+        self._arm_timer()
+        self._emit_changes()
+
+        # Keep the source, unless the watch is broken
+        return not error
+
+    def _defer(self, function, *args):
+        """Run a function in the main loop (called from the worker pool)."""
+        gobject.idle_add(self._run_deferred, function, args)
+
+    def _run_deferred(self, function, args):
+        """Run a deferred function (see _defer), and publish the results."""
+        function(*args)
+        self._reload_score()
+
+        # The deadlines changed
+        self._arm_timer()
+        self._emit_changes()
+        return False
+
+    def _reload_score(self):
+        """Reload the score from the results of the test manager."""
+        self._test_manager.reload_score()
+        self._score = self._test_manager.score
+
+    def _emit_changes(self):
+        """Publish the new results and emit the signals that are needed."""
+        signals_config = self._config["global"]["signals"]
+        test_data = self._test_manager.test_data
+
+        # Nothing changed since the last call
+        updated = self._test_manager.take_updated()
+        if not updated:
+            return
+
+        # Publish the results in the shared memory
+        if self._publisher is not None:
+            self._publisher.publish(
+                self._test_manager.score,
+                {
+                    check_name: (data["score"], data["last_run"])
+                    for check_name, data in test_data.items()
+                },
+                time.time(),
+            )
+
+        # Emit the results of the checks that were run
+        for check_name in sorted(updated):
+            # Failed checks are sent as -1
+            score = -1
+            if check_name in test_data:
+                score = test_data[check_name]["score"]
+
+            previous = self._signaled_checks.get(check_name)
+            if previous is not None and \
+                    (score == -1) == (previous == -1) and \
+                    abs(score - previous) < signals_config["check_delta"]:
+                continue
+            self._signaled_checks[check_name] = score
+            self.CheckResult(check_name, score)
+
+        # Emit the global score
+        score = self._test_manager.score
+        if score is None:
+            return
+        if self._signaled_score is not None and \
+                abs(score - self._signaled_score) < \
+                signals_config["score_delta"]:
+            return
+        self._signaled_score = score
+        self.ScoreChanged(score)
+
     @dbus.service.method(
         f"{BUS_NAME}.Run",
         in_signature='',
         out_signature='',
+        async_callbacks=("reply", "error"),
     )
-    def run_all(self):
-        """Run all the tests."""
+    def run_all(self, reply, error):
+        """Run all the tests (the reply is sent once they're done)."""
         # Log the running of all the tests
         logger.debug("Running all tests")
 
-        # Run the tests
-        self._test_manager.run_all()
+        # Start the tests
+        self._test_manager.start_checks(
+            self._test_manager.config["checks_to_perform"],
+            self._defer,
+            reply,
+        )
+        self._reload_score()
+
+        # The deadlines changed
+        self._arm_timer()
+        self._emit_changes()
 
     @dbus.service.method(
         f"{BUS_NAME}.Run",
         in_signature='s',
-        out_signature=''
+        out_signature='',
+        async_callbacks=("reply", "error"),
     )
-    def run_check(self, check_name):
-        """Run a check."""
+    def run_check(self, check_name, reply, error):
+        """Run a check (the reply is sent once it's done)."""
         # Log the running of a test
         logger.debug("Running test: %s", check_name)
 
-        # Run the test
-        self._test_manager.run_check(check_name)
+        # Start the test
+        self._test_manager.start_checks([check_name], self._defer, reply)
 
         # Reload the score
-        self._test_manager.reload_score()
+        self._reload_score()
+
+        # The deadline of the check changed
+        self._arm_timer()
+        self._emit_changes()
 
     @dbus.service.method(
         f"{BUS_NAME}.Run",
         in_signature='',
-        out_signature=''
+        out_signature='',
+        async_callbacks=("reply", "error"),
     )
-    def run_needed(self):
-        """Run the tests that are needed."""
-        self._test_manager.run_needed()
+    def run_needed(self, reply, error):
+        """Run the tests that are needed (the reply is sent once done)."""
+        self._test_manager.start_needed(self._defer, reply)
+        self._reload_score()
+
+        # The deadlines changed
+        self._arm_timer()
+        self._emit_changes()
 
     @dbus.service.method(
         f"{BUS_NAME}.Score",
@@ -137,9 +335,104 @@ class Service(dbus.service.Object):
         # Log the getting of the score
         logger.debug("Getting score")
 
-        # Return the score
+        # Return the score (-1 if it's unknown: no check passed yet, like in
+        # GetSnapshot)
+        if self._test_manager.score is None:
+            return -1
         return self._test_manager.score
 
+    @dbus.service.method(
+        f"{BUS_NAME}.Score",
+        in_signature='',
+        out_signature='s',
+    )
+    def get_failed(self):
+        """Get the failed checks."""
+        # Log the getting of the failed checks
+        logger.debug("Getting failed checks")
+
+        # Return the failure state of each failed check (number of
+        # consecutive failures, retry interval, last and next run)
+        return json.dumps(self._test_manager.failures)
+
+    @dbus.service.method(
+        f"{BUS_NAME}.Snapshot",
+        in_signature='',
+        # Global score, and (name, score, last run, next run, duration,
+        # failed) of each check
+        out_signature='(da(sddddb))',
+    )
+    def GetSnapshot(self):
+        """Get the score and the state of every check in one call."""
+        # Log the getting of the snapshot
+        logger.debug("Getting snapshot")
+
+        # Build the snapshot only if a result changed since the last call
+        version = self._test_manager.version
+        if self._snapshot[0] != version:
+            self._snapshot = (version, self._test_manager.snapshot())
+
+        # Return the snapshot
+        return self._snapshot[1]
+
+    @dbus.service.method(
+        f"{BUS_NAME}.History",
+        # Check name, start and end timestamps
+        in_signature='sdd',
+        # (timestamp, value) results
+        out_signature='a(dd)',
+    )
+    def GetHistory(self, check_name, start, end):
+        """Get the results of a check in a time range."""
+        # Log the getting of the history
+        logger.debug("Getting history of: %s", check_name)
+
+        # The history may be disabled
+        if self._test_manager.history is None:
+            return []
+
+        # Return the results
+        return self._test_manager.history.query(check_name, start, end)
+
+    @dbus.service.method(
+        f"{BUS_NAME}.History",
+        # Check name, start and end timestamps, maximum number of points (0
+        # for no limit)
+        in_signature='sddu',
+        # Resolution (0 for raw results), and (timestamp, min, max, mean,
+        # last) points
+        out_signature='(da(ddddd))',
+    )
+    def QueryHistory(self, check_name, start, end, max_points):
+        """Get the results of a check in a time range, downsampled."""
+        # Log the querying of the history
+        logger.debug("Querying history of: %s", check_name)
+
+        # The history may be disabled
+        if self._test_manager.history is None:
+            return 0, []
+
+        # Return the resolution and the points
+        return self._test_manager.history.query_rollup(
+            check_name, start, end, max_points
+        )
+
+    @dbus.service.signal(
+        f"{BUS_NAME}.Score",
+        signature='d',
+    )
+    def ScoreChanged(self, score):
+        """Signal that the score changed by at least score_delta."""
+        logger.debug("Score changed: %s", score)
+
+    @dbus.service.signal(
+        f"{BUS_NAME}.Score",
+        signature='sd',
+    )
+    def CheckResult(self, check_name, score):
+        """Signal that a check result changed by at least check_delta."""
+        logger.debug("Check result: %s: %s", check_name, score)
+
     @dbus.service.method(
         f"{BUS_NAME}.Config",
         # We take a string as input (path to the part of the config we want)
@@ -173,6 +466,10 @@ class Service(dbus.service.Object):
         # Save the config in the test manager
         self._test_manager.set_config(self._config)
 
+        # The edited checks are scheduled to run now
+        self._arm_timer()
+        self._update_watches()
+
     @dbus.service.method(
         f"{BUS_NAME}.Quit",
         in_signature='',
@@ -0,0 +1,412 @@
+"""Health Check - A simple health check script for your server."""
+
+# This file is part of the healthcheck package.
+#
+# The healthcheck package is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# The healthcheck package is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# the healthcheck package.  If not, see <http://www.gnu.org/licenses/>.
+
+# Standard library imports
+import logging
+import hashlib
+import mmap
+import os
+import struct
+import zlib
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Log the loading of the history module
+logger.debug("Loading module: %s from %s", __name__, __file__)
+
+# File layout: a header, followed by a fixed number of check slots. Each slot
+# has the key of the check, followed by its ring buffer.
+# Header: magic, version, number of slots, capacity of the raw ring buffers,
+# checksum of the rollups layout (padded, so the doubles are aligned)
+HEADER = struct.Struct("<4sIIII4x")
+MAGIC = b"HCHS"
+VERSION = 4
+
+# Slot key: hash of the name of the check (or metric), so names of any length
+# are matched exactly, and hash of the name of its check (see retain). A free
+# slot has a zero key.
+KEY_SIZE = 16
+NAME = struct.Struct(f"<{KEY_SIZE}s{KEY_SIZE}s")
+FREE = bytes(KEY_SIZE)
+
+# Ring buffer state: position of the next record, number of records
+RING_HEADER = struct.Struct("<QQ")
+
+# Size of a double, in bytes
+DOUBLE_SIZE = struct.calcsize("d")
+
+
+def _key(name):
+    """Get the slot key of a name."""
+    return hashlib.blake2b(name.encode(), digest_size=KEY_SIZE).digest()
+
+
+def default_path():
+    """Get the default path of the history file."""
+    state_dir = os.environ.get("XDG_STATE_HOME") or \
+        os.path.join(os.path.expanduser("~"), ".local", "state")
+    return os.path.join(state_dir, "healthcheck", "history")
+
+
+class RingBuffer:
+    """Fixed-size ring buffer of records made of doubles.
+
+    Each field of the records is a column of doubles, read and written in
+    place in the buffer (a memory-mapped file, so the records survive
+    restarts) through a memoryview, so the records aren't copied in memory.
+    The first field must be a timestamp (increasing), it's used for range
+    queries.
+    """
+
+    def __init__(self, fields, capacity, buffer=None, offset=0):
+        """Initialize the ring buffer (loaded from the buffer, if given)."""
+        self.fields = fields
+        self.capacity = capacity
+
+        # Use a buffer of our own if none is given (viewed through a
+        # memoryview, so slicing it doesn't copy it)
+        if buffer is None:
+            buffer = bytearray(self.size(fields, capacity))
+            offset = 0
+        buffer = memoryview(buffer)
+        self._buffer = buffer
+        self._offset = offset
+
+        # Load the state, and map the columns
+        self._head, self._count = RING_HEADER.unpack_from(buffer, offset)
+        self._columns = []
+        for field in range(fields):
+            start = offset + RING_HEADER.size + \
+                field * capacity * DOUBLE_SIZE
+            self._columns.append(
+                buffer[start:start + capacity * DOUBLE_SIZE].cast("d")
+            )
+
+    @staticmethod
+    def size(fields, capacity):
+        """Get the size of a ring buffer in a memory-mapped buffer."""
+        return RING_HEADER.size + fields * capacity * DOUBLE_SIZE
+
+    def release(self):
+        """Release the views of the buffer (before closing it)."""
+        for column in self._columns:
+            column.release()
+        self._columns = []
+        self._buffer.release()
+
+    def __len__(self):
+        """Return the number of records."""
+        return self._count
+
+    def _position(self, index):
+        """Get the position of a record in the columns (0 is the oldest)."""
+        return (self._head - self._count + index) % self.capacity
+
+    def _write(self, position, values):
+        """Write a record at a position in the columns."""
+        for field, value in enumerate(values):
+            self._columns[field][position] = value
+
+    def append(self, *values):
+        """Append a record (the oldest record is dropped if full)."""
+        self._write(self._head, values)
+        self._head = (self._head + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+        RING_HEADER.pack_into(self._buffer, self._offset, self._head,
+                              self._count)
+
+    def update_last(self, *values):
+        """Replace the newest record."""
+        self._write((self._head - 1) % self.capacity, values)
+
+    def record(self, index):
+        """Get a record (0 is the oldest, -1 the newest)."""
+        if index < 0:
+            index += self._count
+        position = self._position(index)
+        return tuple(column[position] for column in self._columns)
+
+    def bisect(self, timestamp):
+        """Get the index of the first record at or after a timestamp."""
+        timestamps = self._columns[0]
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if timestamps[self._position(middle)] < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def range(self, start, end):
+        """Get the records between two timestamps (included)."""
+        first = self.bisect(start)
+        last = self.bisect(end)
+        # Include the records at the end timestamp
+        while last < self._count and \
+                self._columns[0][self._position(last)] == end:
+            last += 1
+        return [self.record(index) for index in range(first, last)]
+
+
+class CheckHistory:
+    """History of a check: raw results, and rollups at several resolutions.
+
+    A rollup record is a (start, min, max, sum, count, last) summary of the
+    results in a time bucket of its resolution (in seconds). It's updated
+    in place while the results fall in the newest bucket.
+    """
+
+    def __init__(self, capacity, rollups, buffer=None, offset=0):
+        """Initialize the history (loaded from the buffer, if given)."""
+        self.raw = RingBuffer(2, capacity, buffer, offset)
+        offset += RingBuffer.size(2, capacity)
+
+        # The rollups, from the finest to the coarsest resolution
+        self.rollups = []
+        for resolution, rollup_capacity in sorted(rollups):
+            self.rollups.append((
+                resolution,
+                RingBuffer(6, rollup_capacity, buffer, offset),
+            ))
+            offset += RingBuffer.size(6, rollup_capacity)
+
+    @staticmethod
+    def size(capacity, rollups):
+        """Get the size of a check history in a memory-mapped buffer."""
+        return RingBuffer.size(2, capacity) + sum(
+            RingBuffer.size(6, rollup_capacity)
+            for _, rollup_capacity in rollups
+        )
+
+    def release(self):
+        """Release the views of the buffer (before closing it)."""
+        self.raw.release()
+        for _, rollup in self.rollups:
+            rollup.release()
+
+    def append(self, timestamp, value):
+        """Record a result, and update the rollups."""
+        self.raw.append(timestamp, value)
+
+        for resolution, rollup in self.rollups:
+            start = timestamp - timestamp % resolution
+            if rollup and rollup.record(-1)[0] == start:
+                # Update the newest bucket
+                _, minimum, maximum, total, count, _ = rollup.record(-1)
+                rollup.update_last(
+                    start,
+                    min(minimum, value),
+                    max(maximum, value),
+                    total + value,
+                    count + 1,
+                    value,
+                )
+            else:
+                # Start a new bucket
+                rollup.append(start, value, value, value, 1, value)
+
+    def _covers(self, ring, start):
+        """Check if a ring buffer has all the records since a timestamp."""
+        # A ring buffer that is not full has all the records
+        return len(ring) < ring.capacity or \
+            (len(ring) and ring.record(0)[0] <= start)
+
+    def query(self, start, end, max_points=0):
+        """Get the results in a time range, downsampled if needed.
+
+        The finest level (raw results or rollup) that has all the results of
+        the range, and that returns at most max_points points (if not zero),
+        is used. If no level returns few enough points, the coarsest one that
+        covers the range is used. Returns the resolution (0 for the raw
+        results) and the points, as (timestamp, min, max, mean, last)
+        tuples.
+        """
+        # Get the levels that have all the records of the range (the raw
+        # results first, then from the finest to the coarsest rollup)
+        levels = [(0, self.raw)] + self.rollups
+        candidates = [
+            (resolution, ring) for resolution, ring in levels
+            if self._covers(ring, start)
+        ] or levels[-1:]
+
+        # Use the finest level that doesn't return too many points
+        resolution, ring = candidates[-1]
+        for candidate_resolution, candidate in candidates:
+            if not max_points:
+                resolution, ring = candidate_resolution, candidate
+                break
+            if candidate_resolution:
+                points = (end - start) / candidate_resolution + 1
+            else:
+                points = candidate.bisect(end) - candidate.bisect(start)
+            if points <= max_points:
+                resolution, ring = candidate_resolution, candidate
+                break
+
+        # Get the points (bucket starts are before the start timestamp)
+        if not resolution:
+            return 0, [
+                (timestamp, value, value, value, value)
+                for timestamp, value in ring.range(start, end)
+            ]
+        return resolution, [
+            (bucket, minimum, maximum, total / count, last)
+            for bucket, minimum, maximum, total, count, last
+            in ring.range(start - start % resolution, end)
+        ]
+
+
+class History:
+    """Per check history of the results, persisted in a memory-mapped file."""
+
+    def __init__(self, path=None, capacity=2160, max_checks=32,
+                 rollups=((300, 288), (3600, 720))):
+        """Open (or create) the history file.
+
+        The rollups are (resolution, capacity) pairs, by default one day of
+        5 minutes buckets and 30 days of 1 hour buckets.
+        """
+        self.path = path or default_path()
+        self.capacity = capacity
+        self.max_checks = max_checks
+        self.rollups = sorted(tuple(rollup) for rollup in rollups)
+
+        # The history of each check, and its (slot, check key), by key
+        self.checks = {}
+        self._slots = {}
+
+        # The checks that weren't recorded because the history is full
+        # (only logged once)
+        self._dropped = set()
+
+        # Create the file with its final size, and map it
+        self._slot_size = NAME.size + \
+            CheckHistory.size(capacity, self.rollups)
+        size = HEADER.size + self._slot_size * max_checks
+        layout = zlib.crc32(repr(self.rollups).encode())
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            # Reset the file if its layout changed
+            header = os.pread(fd, HEADER.size, 0)
+            if len(header) != HEADER.size or \
+                    HEADER.unpack(header) != (MAGIC, VERSION, max_checks,
+                                              capacity, layout):
+                if header:
+                    logger.warning("History file layout changed, resetting "
+                                   "it: %s", self.path)
+                os.ftruncate(fd, 0)
+            os.ftruncate(fd, size)
+            self._mmap = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        HEADER.pack_into(self._mmap, 0, MAGIC, VERSION, max_checks, capacity,
+                         layout)
+        self._view = memoryview(self._mmap)
+
+        # Load the checks
+        self._free_slots = []
+        for slot in range(max_checks):
+            offset = self._slot_offset(slot)
+            key, check_key = NAME.unpack_from(self._mmap, offset)
+            if key == FREE:
+                self._free_slots.append(slot)
+                continue
+            self.checks[key] = CheckHistory(
+                capacity, self.rollups, self._view, offset + NAME.size
+            )
+            self._slots[key] = (slot, check_key)
+        self._free_slots.reverse()
+        logger.debug("Loaded history of %s checks from: %s",
+                     len(self.checks), self.path)
+
+    def _slot_offset(self, slot):
+        """Get the offset of a slot in the file."""
+        return HEADER.size + slot * self._slot_size
+
+    def _get_check(self, name, check):
+        """Get the history of a check (allocated if needed)."""
+        key = _key(name)
+        if key in self.checks:
+            return self.checks[key]
+
+        if not self._free_slots:
+            if name not in self._dropped:
+                self._dropped.add(name)
+                logger.warning("History is full, not recording: %s", name)
+            return None
+
+        # Allocate a slot (with empty ring buffers)
+        slot = self._free_slots.pop()
+        offset = self._slot_offset(slot)
+        self._mmap[offset:offset + self._slot_size] = bytes(self._slot_size)
+        check_key = _key(check)
+        NAME.pack_into(self._mmap, offset, key, check_key)
+        history = CheckHistory(self.capacity, self.rollups, self._view,
+                               offset + NAME.size)
+        self.checks[key] = history
+        self._slots[key] = (slot, check_key)
+        return history
+
+    def append(self, name, timestamp, value, check=None):
+        """Record a result of a check (or of a metric of the check)."""
+        if (history := self._get_check(name, check or name)) is not None:
+            history.append(timestamp, value)
+
+    def retain(self, checks):
+        """Free the slots of the checks that aren't in checks.
+
+        The slots of the metrics of these checks are freed too.
+        """
+        keys = {_key(check) for check in checks}
+        freed = 0
+        for key, (slot, check_key) in list(self._slots.items()):
+            if check_key in keys:
+                continue
+            NAME.pack_into(self._mmap, self._slot_offset(slot), FREE, FREE)
+            self.checks.pop(key).release()
+            del self._slots[key]
+            self._free_slots.append(slot)
+            freed += 1
+        if freed:
+            # The checks that didn't fit may fit now
+            self._dropped.clear()
+            logger.info("Freed the history of %s removed checks or metrics",
+                        freed)
+
+    def query(self, name, start, end):
+        """Get the (timestamp, value) results of a check in a time range."""
+        if (history := self.checks.get(_key(name))) is None:
+            return []
+        return history.raw.range(start, end)
+
+    def query_rollup(self, name, start, end, max_points=0):
+        """Get the results of a check in a time range, downsampled."""
+        if (history := self.checks.get(_key(name))) is None:
+            return 0, []
+        return history.query(start, end, max_points)
+
+    def close(self):
+        """Write the history to the disk and close the file."""
+        # The views of the file must be released before closing it
+        for history in self.checks.values():
+            history.release()
+        self._view.release()
+        self._mmap.flush()
+        self._mmap.close()
@@ -33,7 +33,7 @@ except ModuleNotFoundError:
 # import healthcheck
 from healthcheck.__version__ import __version__
 import healthcheck.config
-import healthcheck.run
+import healthcheck.command_worker
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -86,5 +86,11 @@ def main():
     # Load the configuration
     config = healthcheck.config.load(args.config)
 
+    # Fork the command worker while the process is still small (the daemon
+    # modules, D-Bus and GLib are imported after)
+    if config["global"]["commands"]["engine"] == "worker":
+        healthcheck.command_worker.start()
+
     # Run the health checks
+    import healthcheck.run
     healthcheck.run.run(config)
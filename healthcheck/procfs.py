@@ -0,0 +1,101 @@
+"""Health Check - A simple health check script for your server."""
+
+# This file is part of the healthcheck package.
+#
+# The healthcheck package is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# The healthcheck package is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# the healthcheck package.  If not, see <http://www.gnu.org/licenses/>.
+
+# Standard library imports
+import logging
+import collections
+import os
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Log the loading of the procfs module
+logger.debug("Loading module: %s from %s", __name__, __file__)
+
+# Result of a scan: number of processes, zombies and threads (tasks), and
+# number of processes of each user (by UID)
+ProcessCounts = collections.namedtuple(
+    "ProcessCounts",
+    ["processes", "zombies", "threads", "users"],
+)
+
+
+def count_threads(proc="/proc"):
+    """Get the number of threads (tasks) of the system from loadavg."""
+    with open(f"{proc}/loadavg", "rb") as loadavg:
+        # The fourth field is running/total tasks
+        return int(loadavg.read().split()[3].split(b"/")[1])
+
+
+def scan(proc="/proc", states=True, owners=True):
+    """Count the processes by scanning /proc.
+
+    This is much faster than creating a psutil.Process for each process: the
+    process directories are listed with os.scandir, and only what is asked
+    is read, with raw system calls relative to the /proc directory. The
+    owners (users) need a stat of each process directory, and the states
+    (zombies) need a read of each /proc/<pid>/stat file (only the state
+    field is parsed). The threads are counted from /proc/loadavg.
+    Zombies and users are None if not asked.
+    """
+    processes = 0
+    zombies = 0 if states else None
+    users = collections.Counter()
+
+    proc_fd = os.open(proc, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        with os.scandir(proc_fd) as entries:
+            for entry in entries:
+                # Only the process directories have a numeric name
+                if not entry.name.isdigit():
+                    continue
+
+                try:
+                    # The owner of the directory is the owner of the process
+                    if owners:
+                        uid = os.stat(entry.name, dir_fd=proc_fd).st_uid
+
+                    if states:
+                        fd = os.open(f"{entry.name}/stat", os.O_RDONLY,
+                                     dir_fd=proc_fd)
+                        try:
+                            data = os.read(fd, 1024)
+                        finally:
+                            os.close(fd)
+                except OSError:
+                    # The process exited in the meantime
+                    continue
+
+                processes += 1
+                if owners:
+                    users[uid] += 1
+                if states:
+                    # The command name can contain spaces and parentheses,
+                    # so the state (first field after the command name) is
+                    # after the last parenthesis
+                    state = data.rindex(b")") + 2
+                    if data[state:state + 1] == b"Z":
+                        zombies += 1
+    finally:
+        os.close(proc_fd)
+
+    return ProcessCounts(
+        processes,
+        zombies,
+        count_threads(proc),
+        dict(users) if owners else None,
+    )
@@ -0,0 +1,221 @@
+"""Health Check - A simple health check script for your server."""
+
+# This file is part of the healthcheck package.
+#
+# The healthcheck package is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# The healthcheck package is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# the healthcheck package.  If not, see <http://www.gnu.org/licenses/>.
+
+# This module only uses the standard library, so it can be imported by
+# lightweight readers (like prompt segments) without loading the daemon.
+
+# Standard library imports
+import math
+import mmap
+import os
+import struct
+
+# Note: logging is only imported by the publisher (daemon side), because its
+# import time is longer than reading the scores.
+
+# File layout: a header, followed by a fixed number of check entries
+# Header: magic, version, sequence, timestamp, score, count, capacity
+HEADER = struct.Struct("<4sIQddII")
+# Check entry: name (NUL padded UTF-8, see entry_name), score, last run
+NAME_SIZE = 64
+ENTRY = struct.Struct(f"<{NAME_SIZE}sdd")
+
+MAGIC = b"HCSC"
+VERSION = 1
+
+# Offset of the sequence number in the header (odd while an update is being
+# written)
+SEQUENCE = struct.Struct("<Q")
+SEQUENCE_OFFSET = 8
+
+# Number of times a reader retries when an update is being written
+READ_RETRIES = 1000
+
+
+def default_path():
+    """Get the default path of the score file."""
+    if runtime_dir := os.environ.get("XDG_RUNTIME_DIR"):
+        return os.path.join(runtime_dir, "healthcheck.score")
+    return f"/tmp/healthcheck-{os.getuid()}.score"
+
+
+def entry_name(name):
+    """Get the name of a check in the score file.
+
+    The names that don't fit in an entry are shortened, and end with a hash
+    of the full name, so they stay unique.
+    """
+    encoded = name.encode()
+    if len(encoded) <= NAME_SIZE:
+        return name
+
+    # Only imported for long names (see the note on logging)
+    import hashlib
+    digest = hashlib.blake2b(encoded, digest_size=8).hexdigest()
+    prefix = encoded[:NAME_SIZE - len(digest) - 1].decode(errors="ignore")
+    return f"{prefix}#{digest}"
+
+
+def _check_owner(fd, path):
+    """Ensure that a file is a regular file of the user (not planted).
+
+    The default path can be in /tmp, where other users can create files.
+    """
+    stat = os.fstat(fd)
+    if stat.st_uid != os.getuid() or stat.st_nlink != 1 or \
+            (stat.st_mode & 0o170000) != 0o100000:
+        raise PermissionError(f"Not a regular file of the user: {path}")
+
+
+class Publisher:
+    """Publish the scores in a memory-mapped file, with a sequence lock."""
+
+    def __init__(self, path=None, capacity=64):
+        """Create (or reset) the score file."""
+        # Set up logging
+        import logging
+        self._logger = logging.getLogger(__name__)
+
+        self.path = path or default_path()
+        self.capacity = capacity
+        self._sequence = 0
+
+        # The checks that weren't published because the file is full (only
+        # logged once)
+        self._dropped = set()
+
+        # Create the file with its final size, and map it (symbolic links
+        # and files of other users are refused)
+        size = HEADER.size + ENTRY.size * capacity
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_NOFOLLOW,
+                     0o644)
+        try:
+            _check_owner(fd, self.path)
+            os.ftruncate(fd, size)
+            self._mmap = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+
+        # Write an empty header (no score yet)
+        self.publish(None, {}, 0)
+        self._logger.debug("Publishing scores in: %s", self.path)
+
+    def publish(self, score, checks, timestamp):
+        """Publish the global score and the (score, last run) of checks."""
+        # Only keep the checks that fit in the file
+        checks = list(checks.items())
+        if len(checks) > self.capacity:
+            dropped = {name for name, _ in checks[self.capacity:]}
+            if not dropped <= self._dropped:
+                self._dropped |= dropped
+                self._logger.warning("Too many checks to publish (%s), only "
+                                     "the %s first ones are published",
+                                     len(checks), self.capacity)
+            checks = checks[:self.capacity]
+
+        # Mark the update as in progress (odd sequence)
+        self._sequence += 1
+        SEQUENCE.pack_into(self._mmap, SEQUENCE_OFFSET, self._sequence)
+
+        # Write the checks, then the header
+        for index, (name, (check_score, last_run)) in enumerate(checks):
+            ENTRY.pack_into(
+                self._mmap,
+                HEADER.size + ENTRY.size * index,
+                entry_name(name).encode(),
+                check_score,
+                last_run,
+            )
+        HEADER.pack_into(
+            self._mmap,
+            0,
+            MAGIC,
+            VERSION,
+            self._sequence,
+            timestamp,
+            math.nan if score is None else score,
+            len(checks),
+            self.capacity,
+        )
+
+        # Mark the update as done (even sequence)
+        self._sequence += 1
+        SEQUENCE.pack_into(self._mmap, SEQUENCE_OFFSET, self._sequence)
+
+    def close(self):
+        """Remove the score file (the scores are not valid anymore)."""
+        self._mmap.close()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def read(path=None):
+    """Read the published scores (None if they are not available).
+
+    The result is a dict with the score (None if unknown), the timestamp of
+    the update, and the (score, last run) of each check (by entry_name).
+    """
+    try:
+        fd = os.open(path or default_path(), os.O_RDONLY | os.O_NOFOLLOW)
+    except OSError:
+        return None
+
+    try:
+        # The default file may have been planted by another user
+        if path is None:
+            try:
+                _check_owner(fd, default_path())
+            except PermissionError:
+                return None
+        size = os.fstat(fd).st_size
+        for _ in range(READ_RETRIES):
+            # Read the whole file, then the sequence again: the data is
+            # consistent if no update started or finished in the meantime
+            data = os.pread(fd, size, 0)
+            if len(data) < HEADER.size:
+                return None
+            magic, version, sequence, timestamp, score, count, _ = \
+                HEADER.unpack_from(data)
+            if magic != MAGIC or version != VERSION:
+                return None
+            if sequence % 2 or SEQUENCE.unpack(
+                os.pread(fd, SEQUENCE.size, SEQUENCE_OFFSET)
+            )[0] != sequence:
+                continue
+
+            # Decode the checks
+            checks = {}
+            for index in range(min(count, (len(data) - HEADER.size) //
+                                   ENTRY.size)):
+                name, check_score, last_run = ENTRY.unpack_from(
+                    data, HEADER.size + ENTRY.size * index
+                )
+                name = name.rstrip(b"\0").decode(errors="replace")
+                checks[name] = (check_score, last_run)
+
+            return {
+                "score": None if math.isnan(score) else score,
+                "timestamp": timestamp,
+                "checks": checks,
+            }
+    finally:
+        os.close(fd)
+
+    # The writer kept updating the file
+    return None
@@ -0,0 +1,149 @@
+"""Health Check - A simple health check script for your server."""
+
+# This file is part of the healthcheck package.
+#
+# The healthcheck package is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# The healthcheck package is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# the healthcheck package.  If not, see <http://www.gnu.org/licenses/>.
+
+# Standard library imports
+import logging
+import heapq
+import itertools
+import math
+import socket
+import time
+import zlib
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Log the loading of the scheduler module
+logger.debug("Loading module: %s from %s", __name__, __file__)
+
+# Marker for heap entries that have been cancelled or rescheduled
+REMOVED = "<removed>"
+
+
+class Scheduler:
+    """Min-heap of checks, keyed by the time they need to run at."""
+
+    def __init__(self, seed=None):
+        """Initialize the scheduler.
+
+        The seed is used to compute the phase of each check (see
+        next_run_at_spread), it defaults to the host name, so the phases
+        are different on each host, but stable across restarts.
+        """
+        self.seed = seed or socket.gethostname()
+
+        # The phase of each check, as a fraction of its interval
+        self._phases = {}
+
+        # The heap of [run_at, sequence, name] entries
+        self._heap = []
+
+        # The current entry of each check (so we can invalidate it)
+        self._entries = {}
+
+        # The last deadline of each check (kept once the check is popped,
+        # see next_run_at_spread)
+        self._deadlines = {}
+
+        # Unique sequence number, used to break ties between equal run_at
+        self._counter = itertools.count()
+
+    def __len__(self):
+        """Return the number of scheduled checks."""
+        return len(self._entries)
+
+    def __contains__(self, name):
+        """Return whether the check is scheduled."""
+        return name in self._entries
+
+    def schedule(self, name, run_at):
+        """Schedule a check (replacing its previous deadline, if any)."""
+        # Invalidate the previous entry, it will be dropped when it reaches
+        # the top of the heap
+        self.cancel(name)
+
+        # Push the new entry
+        self._deadlines[name] = run_at
+        entry = [run_at, next(self._counter), name]
+        self._entries[name] = entry
+        heapq.heappush(self._heap, entry)
+
+    def cancel(self, name):
+        """Remove a check from the scheduler."""
+        entry = self._entries.pop(name, None)
+        if entry is not None:
+            entry[-1] = REMOVED
+
+    def clear(self):
+        """Remove all the checks from the scheduler."""
+        self._heap.clear()
+        self._entries.clear()
+        self._deadlines.clear()
+
+    def _drop_removed(self):
+        """Pop the invalidated entries from the top of the heap."""
+        while self._heap and self._heap[0][-1] is REMOVED:
+            heapq.heappop(self._heap)
+
+    def phase(self, name):
+        """Get the phase of a check, as a fraction of its interval."""
+        if name not in self._phases:
+            # Use a stable hash (the built-in hash of strings is randomized)
+            digest = zlib.crc32(f"{self.seed}/{name}".encode())
+            self._phases[name] = digest / 2 ** 32
+        return self._phases[name]
+
+    def next_run_at_spread(self, name, now, interval, grid):
+        """Get the next deadline of a check, at the phase of the check.
+
+        The deadlines of a check are on a grid (its check interval), shifted
+        by its phase, so checks with the same interval don't all run at the
+        same time (on the same host, and across hosts). The deadline is the
+        first point of the grid at least interval seconds after the previous
+        deadline (if the check is run for it), or after now (if it's run
+        early or late), so a check never runs more often than asked, even
+        with an interval that isn't the grid (backoff, adaptive intervals).
+        An interval shorter than the grid is used as the grid, so a check
+        isn't run less often than asked either.
+        """
+        start = self._deadlines.get(name)
+        if start is None or not now - interval < start <= now:
+            start = now
+        offset = self.phase(name) * grid
+        grid = min(grid, interval)
+        # Allow for rounding errors, so a deadline on the grid stays there
+        points = math.ceil((start + interval - offset) / grid - 1e-9)
+        return offset + points * grid
+
+    def next_run_at(self):
+        """Return the nearest deadline, or None if nothing is scheduled."""
+        self._drop_removed()
+        if not self._heap:
+            return None
+        return self._heap[0][0]
+
+    def pop_due(self, now=None):
+        """Pop the checks whose deadline has passed, nearest first."""
+        if now is None:
+            now = time.time()
+
+        due = []
+        while (run_at := self.next_run_at()) is not None and run_at <= now:
+            name = heapq.heappop(self._heap)[-1]
+            del self._entries[name]
+            due.append(name)
+        return due
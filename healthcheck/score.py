@@ -50,92 +50,132 @@ def _global_score(score, config):
     return score_percentage
 
 
-def calculate(score_list, config):
-    """Calculate the score from a list of scores."""
-    # Move ignore if up average at the end of the list (we need to know the
-    # average of the other tests). It's stored in
-    # score_list[item]["config"]["ignore_if_up_average"]
-    ignore_if_up_average = score_list.copy()
-    for item, value in score_list.items():
-        if value["config"]["ignore_if_up_average"]:
-            del ignore_if_up_average[item]
-            ignore_if_up_average[item] = value
+def _percentage(value):
+    """Get the score percentage of a test (between 0 and 100)."""
+    # Get the score
+    score_item = value["score"]
+    # Get the minimum and maximum score
+    score_min = value["config"]["min"]
+    score_max = value["config"]["max"]
+
+    # Get the score percentage
+    score_percentage = (score_item - score_min) / (score_max - score_min) * 100
+
+    # Ensure the score percentage is between 0 and 100
+    return max(0, min(100, score_percentage))
+
+
+class ScoreEngine:
+    """Incremental score calculation.
+
+    The percentage and the coefficient of each test are kept between the
+    computations, and the score is only computed again when a test changed
+    since the last computation. The tests that are ignored if they increase
+    the average (ignore_if_up_average) are kept in order, and are applied
+    after the other tests, like in the full calculation.
+    """
+
+    def __init__(self, config):
+        """Initialize the engine."""
+        self.config = config
+
+        # The (percentage, coefficient, ignore_if_up_average) of the tests.
+        # An updated test keeps its position, like in the test data, so the
+        # sums are done in the same order as the full calculation (and give
+        # exactly the same result).
+        self._tests = {}
+
+        # Cached result (valid until a test changes)
+        self._result = None
+        self._dirty = True
+
+    def update(self, item, value):
+        """Update the score of a test (value is a test data entry)."""
+        entry = (_percentage(value), value["config"]["coeff"],
+                 bool(value["config"]["ignore_if_up_average"]))
+
+        # Nothing to do if the test didn't change
+        if self._tests.get(item) == entry:
+            return
+        self._tests[item] = entry
+        self._dirty = True
+
+    def remove(self, item):
+        """Remove a test from the score."""
+        if self._tests.pop(item, None) is not None:
+            self._dirty = True
+
+    def set_config(self, config):
+        """Set the config (the global score settings may have changed)."""
+        self.config = config
+        self._dirty = True
+
+    def score(self):
+        """Get the global score (None if there is no test)."""
+        # Nothing changed since the last computation
+        if not self._dirty:
+            return self._result
+
+        # Sum the regular tests
+        score = 0
+        total_coefficients = 0
+        for score_percentage, coefficient, ignore in self._tests.values():
+            if not ignore:
+                score += score_percentage * coefficient
+                total_coefficients += coefficient
+
+        # Apply the tests that are ignored if they increase the average
+        for item, (score_percentage, coefficient, ignore) in \
+                self._tests.items():
+            if not ignore:
+                continue
+            score_to_add = score_percentage * coefficient
+            if total_coefficients:
+                # Get the actual average
+                actual_average = score / total_coefficients
+                # Get the average with the current test
+                average_with_current_test = (score + score_to_add) /\
+                                            (total_coefficients + coefficient)
+                # If the average with the current test is up, we ignore the
+                # test. We need to invert the score to check if the average
+                # is up, because the score is reversed after the calculation.
+                if average_with_current_test < actual_average:
+                    # For the logging, we need to invert the score if needed
+                    if not self.config["global"]["score"]["lower_is_better"]:
+                        average_with_current_test = \
+                            100 - average_with_current_test
+                        actual_average = 100 - actual_average
+                    logger.debug("Test %s ignored because it would increase "
+                                 "the average (current average: %s, average "
+                                 "with test: %s)", item, actual_average,
+                                 average_with_current_test)
+                    continue
+            score += score_to_add
+            total_coefficients += coefficient
+
+        # Calculate the global score from the average score
+        if total_coefficients:
+            self._result = _global_score(score / total_coefficients,
+                                         self.config)
+        else:
+            self._result = None
+        self._dirty = False
+
+        logger.debug("Score: %s", self._result)
+        return self._result
 
-    # Replace the score_list with the new one
-    score_list = ignore_if_up_average
 
+def calculate(score_list, config):
+    """Calculate the score from a list of scores."""
     # Create a copy of the score list without the config part of each subdict
     # (for logging purpose)
     score_list_copy = {item: value["score"] for item, value in score_list.items()}
     logger.debug("Calculating score from list: %s", score_list_copy)
 
-    # Initialize the score
-    score = 0
-
-    # Total number of coefficients, used to calculate the average
-    total_coefficients = 0
-
-    # Loop over the scores
+    # Add the scores to a new engine
+    engine = ScoreEngine(config)
     for item, value in score_list.items():
-        # Get the score
-        score_item = value["score"]
-        # Get the minimum and maximum score
-        score_min = value["config"]["min"]
-        score_max = value["config"]["max"]
-
-        # Get the score percentage
-        score_percentage = (score_item - score_min) / (score_max - score_min) * 100
-
-        # Ensure the score percentage is between 0 and 100
-        score_percentage = max(0, min(100, score_percentage))
-
-        # Get the coefficient
-        coefficient = value["config"]["coeff"]
-
-        # Compute the score to add
-        score_to_add = score_percentage * coefficient
-        # If the test is ignored if the average is up, we need to check the
-        # average
-        if value["config"]["ignore_if_up_average"]:
-            # Get the actual average
-            actual_average = score / total_coefficients
-            # Get the average with the current test
-            average_with_current_test = (score + score_to_add) /\
-                                        (total_coefficients + coefficient)
-            # If the average with the current test is up, we ignore the test.
-            # We need to invert the score to check if the average is up,
-            # because the score is reversed after the calculation.
-            if average_with_current_test < actual_average:
-                # For the logging, we need to invert the score if needed
-                if not config["global"]["score"]["lower_is_better"]:
-                    average_with_current_test = 100 - average_with_current_test
-                    actual_average = 100 - actual_average
-                logger.debug("Test %s ignored because it would increase the "
-                             "average (current average: %s, average with "
-                             "test: %s)", item, actual_average,
-                             average_with_current_test)
-                continue
-        score += score_percentage * coefficient
-
-        # Add the coefficient to the total number of coefficients
-        total_coefficients += coefficient
-
-        # Calculate the average temporary score
-        temp_score = score / total_coefficients
-
-        # Calculate the temporary global score
-        temp_global_score = _global_score(temp_score, config)
-
-        # Log the temporary score
-        logger.debug(
-            "Score with %s: %s", item, temp_global_score
-        )
-
-    # Calculate the average score
-    score = score / total_coefficients
-
-    # Calculate the global score
-    score_percentage = _global_score(score, config)
+        engine.update(item, value)
 
     # Return the score
-    return score_percentage
+    return engine.score()
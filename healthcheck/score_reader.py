@@ -0,0 +1,93 @@
+"""Health Check - A simple health check script for your server."""
+
+# This file is part of the healthcheck package.
+#
+# The healthcheck package is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# The healthcheck package is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# the healthcheck package.  If not, see <http://www.gnu.org/licenses/>.
+
+# This is a lightweight alternative to client.py, for prompts and status
+# bars: it only imports the standard library, reads the score published by
+# the daemon in shared memory, and only falls back to D-Bus (importing dbus)
+# if the score isn't published.
+#
+# Usage: python3 -m healthcheck.score_reader [--path PATH] [CHECK]
+
+# Standard library imports
+import sys
+
+# Import the shared memory reader (standard library only)
+import healthcheck.publish
+
+BUS_NAME = "org.healthcheck"
+OBJECT_PATH = "/org/healthcheck"
+
+# Value printed when the score is not available (like in the README examples)
+UNAVAILABLE = -1
+
+
+def read_dbus():
+    """Get the score from the daemon over D-Bus (None if not available)."""
+    try:
+        import dbus
+        bus = dbus.SessionBus()
+        service = bus.get_object(BUS_NAME, OBJECT_PATH)
+        return float(service.get_score(dbus_interface=f"{BUS_NAME}.Score"))
+    except Exception:
+        return None
+
+
+def read_score(path=None, check=None):
+    """Get the global score, or the score of a check (None if unknown)."""
+    # Read the shared memory (the fastest channel)
+    published = healthcheck.publish.read(path)
+    if published is not None:
+        if check is not None:
+            return published["checks"].get(
+                healthcheck.publish.entry_name(check), (None, None)
+            )[0]
+        if published["score"] is not None:
+            return published["score"]
+
+    # Per check scores are only available in shared memory
+    if check is not None:
+        return None
+
+    # Fall back to D-Bus
+    return read_dbus()
+
+
+def main(argv=None):
+    """Print the score."""
+    args = sys.argv[1:] if argv is None else argv
+
+    # Parse the arguments (argparse is not used, to keep the start-up fast)
+    path = None
+    check = None
+    while args:
+        arg = args.pop(0)
+        if arg in ("-h", "--help"):
+            print("usage: python3 -m healthcheck.score_reader "
+                  "[--path PATH] [CHECK]")
+            return 0
+        if arg == "--path" and args:
+            path = args.pop(0)
+        else:
+            check = arg
+
+    score = read_score(path, check)
+    print(UNAVAILABLE if score is None else score)
+    return 0 if score is not None else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+"""Health Check - A simple health check script for your server."""
+
+# This file is part of the healthcheck package.
+#
+# The healthcheck package is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# The healthcheck package is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# the healthcheck package.  If not, see <http://www.gnu.org/licenses/>.
+
+# Standard library imports
+import logging
+import threading
+
+# Third party imports
+import psutil
+
+# Import the /proc scanner
+import healthcheck.procfs
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Log the loading of the snapshot module
+logger.debug("Loading module: %s from %s", __name__, __file__)
+
+
+class Snapshot:
+    """System data shared by the built-in tests run at the same time.
+
+    Each value is read from the system (with psutil) the first time a test
+    asks for it, and the same value is returned to the other tests, so the
+    /proc and /sys files are read and parsed once per run, like
+    psutil.Process.oneshot does for a process.
+    """
+
+    def __init__(self):
+        """Initialize the snapshot."""
+        self._cache = {}
+        # Tests can run in several threads at the same time
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        """Get the state to pickle (for process workers, without the lock)."""
+        return self._cache
+
+    def __setstate__(self, state):
+        """Restore the pickled state."""
+        self._cache = state
+        self._lock = threading.Lock()
+
+    def _get(self, key, function, *args, **kwargs):
+        """Get a cached value (read from the system if not cached)."""
+        with self._lock:
+            if key not in self._cache:
+                self._cache[key] = function(*args, **kwargs)
+            return self._cache[key]
+
+    def boot_time(self):
+        """Get the boot time."""
+        return self._get("boot_time", psutil.boot_time)
+
+    def cpu_times(self):
+        """Get the cumulative CPU times."""
+        return self._get("cpu_times", psutil.cpu_times)
+
+    def virtual_memory(self):
+        """Get the memory usage."""
+        return self._get("virtual_memory", psutil.virtual_memory)
+
+    def getloadavg(self):
+        """Get the load average."""
+        return self._get("getloadavg", psutil.getloadavg)
+
+    def disk_usage(self, path):
+        """Get the disk usage of a path."""
+        return self._get(("disk_usage", path), psutil.disk_usage, path)
+
+    def disk_io_counters(self, perdisk=False):
+        """Get the disk I/O counters."""
+        return self._get(("disk_io_counters", perdisk),
+                         psutil.disk_io_counters, perdisk=perdisk)
+
+    def process_counts(self, states=True, owners=True):
+        """Get the process counts (see healthcheck.procfs.scan)."""
+        # Reuse a scan that read at least what is asked
+        for cached_states, cached_owners in ((True, True), (states, True),
+                                             (True, owners)):
+            key = ("process_counts", cached_states, cached_owners)
+            if key in self._cache:
+                return self._cache[key]
+        return self._get(("process_counts", states, owners),
+                         healthcheck.procfs.scan,
+                         states=states, owners=owners)
@@ -17,12 +17,30 @@
 
 # Standard library imports
 import logging
+import concurrent.futures
 import copy
+import fnmatch
+import math
+import re
 import time
 
 # Import the score calculation function
 import healthcheck.score
 
+# Import the scheduler, and the adaptive intervals
+import healthcheck.scheduler
+import healthcheck.adaptive
+
+# Import the command runner, and the command worker
+import healthcheck.command_runner
+import healthcheck.command_worker
+
+# Import the history store
+import healthcheck.history
+
+# Import the shared system data
+import healthcheck.snapshot
+
 # Import the tests
 import healthcheck.tests.command
 import healthcheck.tests.cpu
@@ -30,6 +48,12 @@ import healthcheck.tests.ram
 import healthcheck.tests.load
 import healthcheck.tests.disk_usage
 import healthcheck.tests.disk_io
+import healthcheck.tests.processes
+import healthcheck.tests.users
+import healthcheck.tests.pressure
+import healthcheck.tests.cgroup
+import healthcheck.tests.logtail
+import healthcheck.tests.endpoint
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -37,12 +61,45 @@ logger = logging.getLogger(__name__)
 # Log the loading of the run module
 logger.debug("Loading module: %s from %s", __name__, __file__)
 
+# Separator between the name of a multi-metric check and its metrics
+METRIC_SEPARATOR = "."
+
+# Time given to the command runner to kill the commands that timed out
+COMMANDS_KILL_DELAY = 1
+
+
+def _run_test(test_to_perform, test, snapshot=None):
+    """Run a test in a worker (returns the test, for process workers)."""
+    start = time.monotonic()
+    # Only the built-in tests use the shared system data
+    result = test.run() if snapshot is None else test.run(snapshot)
+    return {test_to_perform: (result, test, time.monotonic() - start)}
+
+
+def _run_worker_test(test_to_perform, test, timeout):
+    """Run a command test in the command worker (if it's running)."""
+    start = time.monotonic()
+    # The worker can't be used from a process worker (or if it stopped), the
+    # test is run directly then
+    if (worker := healthcheck.command_worker.get()) is not None:
+        result = test.run_worker(worker, timeout)
+    else:
+        result = test.run()
+    return {test_to_perform: (result, test, time.monotonic() - start)}
+
+
 TESTS = {
     "cpu": healthcheck.tests.cpu.Test,
     "ram": healthcheck.tests.ram.Test,
     "load": healthcheck.tests.load.Test,
     "disk_usage": healthcheck.tests.disk_usage.Test,
     "disk_io": healthcheck.tests.disk_io.Test,
+    "processes": healthcheck.tests.processes.Test,
+    "users": healthcheck.tests.users.Test,
+    "pressure": healthcheck.tests.pressure.Test,
+    "cgroup": healthcheck.tests.cgroup.Test,
+    "logtail": healthcheck.tests.logtail.Test,
+    "endpoint": healthcheck.tests.endpoint.Test,
 }
 
 
@@ -55,44 +112,97 @@ class TestManager:
         # to be modified by the dbus daemon)
         self.config = copy.deepcopy(config)
 
-        # Create the test data
+        # Create the set of the enabled checks (checks_to_perform is a list)
+        self.enabled = set(self.config["checks_to_perform"])
+
+        # Create the test data, and the data of the failed tests
         self.test_data = {}
+        self.failures = {}
+
+        # Create the current intervals of the adaptive checks
+        self.intervals = {}
+
+        # Create the file descriptors of the event-driven checks (the checks
+        # that are run when their file descriptor is ready, see watches)
+        self.watched = {}
+
+        # Create the metrics of the multi-metric checks (the names of their
+        # test data entries), and the cached configs of the metrics
+        self.metrics = {}
+        self.metric_configs = {}
+
+        # Create the version of the results (incremented on each result)
+        self.version = 0
 
         # Create the test instances cache (so tests can use self to store
         # things)
         self.test_instances = {}
 
-        # Create the score
+        # Create the score, and the engine that keeps it up to date
         self.score = None
+        self.score_engine = healthcheck.score.ScoreEngine(self.config)
+
+        # Create the scheduler (checks ordered by their next run time)
+        self.scheduler = healthcheck.scheduler.Scheduler(
+            self.config["global"]["scheduler"]["seed"] or None
+        )
+
+        # Create the history of the results
+        self.history = None
+        history_config = self.config["global"]["history"]
+        if history_config["enabled"]:
+            try:
+                self.history = healthcheck.history.History(
+                    history_config["path"] or None,
+                    history_config["capacity"],
+                    history_config["max_checks"],
+                    history_config["rollups"],
+                )
+            except OSError as error:
+                logger.warning("Not keeping the history: %s", error)
+            else:
+                # Free the history of the checks that were removed
+                self.history.retain(self.config["checks_to_perform"])
 
-        # Create the ready flag (for run_needed)
+        # Create the worker pool, the futures of the running tests, and the
+        # jobs whose results weren't added yet, as {future: (tests, deadline,
+        # start time, batch)}
+        self.executor = self._create_executor()
+        self.running = {}
+        self.jobs = {}
+
+        # Create the set of tests that were run since the last call to
+        # take_updated
+        self.updated = set()
+
+        # Create the ready flag (set by run_all, for run_needed)
         self.ready = False
 
-    def run_check_real(self, test_to_perform):
-        """Run a single check."""
-        # Check if the test config exists
-        if test_to_perform not in self.config["checks"]:
-            logger.warning("Test config not found: %s", test_to_perform)
-            return False
+    def get_test(self, test_to_perform):
+        """Get the test instance of a check (created if not cached)."""
         # Get the config
         test_config = self.config["checks"][test_to_perform]
 
-        # Initialize the test instance if not cached
+        # Return the cached test instance
         if test_to_perform in self.test_instances:
-            # Get the test instance
-            test = self.test_instances[test_to_perform]
-
-        elif "command" in test_config:
-            # Initialize the test
-            test = healthcheck.tests.command.Test(
-                test_to_perform,
-                test_config["command"],
-                test_config["command_run_language"],
-                test_config.get("regex", None),
-            )
-
-            # Add the test to the test instances cache
-            self.test_instances[test_to_perform] = test
+            return self.test_instances[test_to_perform]
+
+        if "command" in test_config or "python" in test_config:
+            # Initialize the test (Python snippets are run like commands)
+            try:
+                test = healthcheck.tests.command.Test(
+                    test_to_perform,
+                    test_config.get("command", test_config.get("python")),
+                    test_config["command_run_language"],
+                    test_config.get("regex", None),
+                    python="command" not in test_config,
+                    stream=test_config["stream_output"],
+                    timeout=test_config["check_timeout"],
+                )
+            except re.error as error:
+                logger.warning("Invalid regex for test %s: %s",
+                               test_to_perform, error)
+                return None
         elif "type" in test_config:
             # Get if the test type is valid
             if test_config["type"] not in TESTS:
@@ -100,73 +210,439 @@ class TestManager:
                     "Invalid test type: %s",
                     test_config["type"]
                 )
-                return False
+                return None
 
             # Initialize the test
             test = TESTS[test_config["type"]](test_config)
-
-            # Add the test to the test instances cache
-            self.test_instances[test_to_perform] = test
         else:
             logger.warning("Invalid test config: %s", test_config)
-            return False
+            return None
 
-        # Run the test and return the result
-        if result := test.run():
-            logger.info("Test passed: %s; Output: %s", test_to_perform, result)
-            return result
-        # If the test failed, log it (we don't use an else here, because the
-        # previous if statement returns)
-        logger.warning("Test failed: %s", test_to_perform)
-        return False
+        # Add the test to the test instances cache
+        self.test_instances[test_to_perform] = test
+        return test
 
-    def run_check(self, test_to_perform):
-        """Wrap the check run to catch exceptions and update test data."""
-        # Ensure that the test config exists
-        if test_to_perform not in self.config["checks"]:
-            logger.warning("Test config not found: %s", test_to_perform)
-            return False
+    def _create_executor(self):
+        """Create the worker pool that runs the checks."""
+        workers_config = self.config["global"]["workers"]
+        if workers_config["type"] == "process":
+            executor_class = concurrent.futures.ProcessPoolExecutor
+        else:
+            executor_class = concurrent.futures.ThreadPoolExecutor
+        return executor_class(max_workers=workers_config["max_workers"])
+
+    def _submit_checks(self, tests_to_perform, results, batch=None):
+        """Submit checks to the worker pool, as (future, tests, deadline) jobs.
+
+        The checks that can't be run are recorded as failed in results. The
+        batch (see start_checks) is notified when the jobs are finished.
+        """
+        # Get the instances of the tests to run
+        tests = {}
+        for test_to_perform in tests_to_perform:
+            # Ensure that the test config exists
+            if test_to_perform not in self.config["checks"]:
+                logger.warning("Test config not found: %s", test_to_perform)
+                results[test_to_perform] = False
+                continue
 
-        # Run the test
-        try:
-            result = self.run_check_real(test_to_perform)
-        except Exception:
-            logger.error("Error running test: %s", test_to_perform)
-            # We return False here, because we don't want to update the test :
-            # False is equivalent to zero, and the score calculation function
-            # will handle it.
+            # Don't run a test twice at the same time (a timed out test can
+            # still be running in a thread). A test whose job isn't done
+            # yet (see start_checks) reports its result when it's done.
+            if test_to_perform in self.running and \
+                    not self.running[test_to_perform].done():
+                if self.running[test_to_perform] in self.jobs:
+                    logger.debug("Test already running: %s",
+                                 test_to_perform)
+                    continue
+                logger.warning("Test still running: %s", test_to_perform)
+                results[test_to_perform] = self._record_result(
+                    test_to_perform, False
+                )
+                continue
+
+            # Get the test instance
+            try:
+                test = self.get_test(test_to_perform)
+            except Exception:
+                logger.exception("Error initializing test: %s",
+                                 test_to_perform)
+                test = None
+            if test is None:
+                results[test_to_perform] = self._record_result(
+                    test_to_perform, False
+                )
+                continue
+            tests[test_to_perform] = test
+
+        # Submit the tests to the worker pool, as (future, tests, deadline)
+        # jobs
+        jobs = []
+        started = time.time()
+
+        # Run the command tests together in an event loop. They enforce their
+        # own timeout once they get a slot, so they're done after as many
+        # longest timeouts as they need rounds of max_concurrency slots. The
+        # runner stops the commands that are still running at that deadline
+        # (and keeps the other results), the job deadline leaves it the time
+        # to kill them.
+        commands_config = self.config["global"]["commands"]
+        commands = {}
+        if commands_config["engine"] == "async":
+            commands = {
+                test_to_perform: test
+                for test_to_perform, test in tests.items()
+                if isinstance(test, healthcheck.tests.command.Test)
+            }
+        if commands:
+            timeouts = {
+                test_to_perform:
+                self.config["checks"][test_to_perform]["check_timeout"]
+                for test_to_perform in commands
+            }
+            rounds = math.ceil(len(commands) /
+                               commands_config["max_concurrency"])
+            deadline = time.time() + rounds * max(timeouts.values())
+            future = self.executor.submit(
+                healthcheck.command_runner.run,
+                commands,
+                timeouts,
+                commands_config["max_concurrency"],
+                deadline,
+            )
+            jobs.append((future, commands, deadline + COMMANDS_KILL_DELAY))
+
+        # Run the other tests one by one (the built-in tests share the same
+        # system data)
+        snapshot = healthcheck.snapshot.Snapshot()
+        for test_to_perform, test in tests.items():
+            if test_to_perform in commands:
+                continue
+            deadline = time.time() + \
+                self.config["checks"][test_to_perform]["check_timeout"]
+
+            # Run the command tests in the command worker
+            if commands_config["engine"] == "worker" and \
+                    isinstance(test, healthcheck.tests.command.Test):
+                future = self.executor.submit(
+                    _run_worker_test,
+                    test_to_perform,
+                    test,
+                    self.config["checks"][test_to_perform]["check_timeout"],
+                )
+                jobs.append((
+                    future,
+                    {test_to_perform: test},
+                    deadline + healthcheck.command_worker.KILL_DELAY,
+                ))
+                continue
+
+            future = self.executor.submit(
+                _run_test,
+                test_to_perform,
+                test,
+                None if isinstance(test, healthcheck.tests.command.Test)
+                else snapshot,
+            )
+            jobs.append((future, {test_to_perform: test}, deadline))
+
+        # Remember the running tests, and the jobs until their results are
+        # added (see _finish_job)
+        for future, job_tests, deadline in jobs:
+            for test_to_perform in job_tests:
+                self.running[test_to_perform] = future
+            self.jobs[future] = (job_tests, deadline, started, batch)
+            if batch is not None:
+                batch["futures"].add(future)
+        return jobs
+
+    def _finish_job(self, future):
+        """Add the results of a job to the test data (once).
+
+        A job that isn't done (it's past its deadline) is cancelled, and its
+        tests are recorded as failed. Returns the results of the tests.
+        """
+        if (job := self.jobs.pop(future, None)) is None:
+            return {}
+        job_tests, _, started, batch = job
+
+        if not future.done():
+            # Cancel the job (it can't be interrupted if it's already
+            # running, but its results will be ignored)
+            future.cancel()
+            logger.warning("Tests timed out: %s", ", ".join(job_tests))
+            job_results = {}
+        elif future.cancelled():
+            logger.warning("Tests cancelled: %s", ", ".join(job_tests))
+            job_results = {}
+        elif future.exception() is not None:
+            logger.error("Error running tests: %s", ", ".join(job_tests),
+                         exc_info=future.exception())
+            job_results = {}
+        else:
+            job_results = future.result()
+
+        results = {}
+        for test_to_perform, test in job_tests.items():
+            # Ignore the tests whose config changed (or that were removed)
+            # while they were running
+            if self.test_instances.get(test_to_perform) is not test:
+                logger.debug("Test changed while running: %s",
+                             test_to_perform)
+                continue
+
+            result, updated_test, duration = job_results.get(
+                test_to_perform, (False, test, time.time() - started)
+            )
+
+            # Keep the state of the test if it was run in another process
+            self.test_instances[test_to_perform] = updated_test
+
+            # Add the result to the test data
+            results[test_to_perform] = self._record_result(
+                test_to_perform, result, duration
+            )
+
+        # Notify the batch once all its jobs are finished
+        if batch is not None:
+            batch["futures"].discard(future)
+            if not batch["futures"] and batch["callback"] is not None:
+                batch["callback"]()
+        return results
+
+    def run_checks(self, tests_to_perform):
+        """Run checks in the worker pool and update the test data."""
+        results = {}
+        jobs = self._submit_checks(tests_to_perform, results)
+
+        # Wait for the tests (they run in parallel, so we wait at most until
+        # the last deadline)
+        for future, _, deadline in jobs:
+            concurrent.futures.wait((future,),
+                                    timeout=max(0, deadline - time.time()))
+            results.update(self._finish_job(future))
+        return results
+
+    def start_checks(self, tests_to_perform, defer, callback=None):
+        """Start checks in the worker pool, without waiting for them.
+
+        The results of a job are added to the test data once it's done, by
+        defer(function, *args), which is called from any thread and runs
+        the function in the thread of the caller (the main loop of the
+        daemon). The jobs that aren't done at their deadline are finished
+        by expire_jobs. The callback is called once all the checks are
+        finished. Returns the results of the checks that couldn't be
+        started.
+        """
+        results = {}
+        batch = {"futures": set(), "callback": callback}
+        jobs = self._submit_checks(tests_to_perform, results, batch)
+        if not jobs and callback is not None:
+            callback()
+        for future, _, _ in jobs:
+            future.add_done_callback(
+                lambda future: defer(self._finish_job, future)
+            )
+        return results
+
+    def expire_jobs(self):
+        """Finish the jobs whose deadline has passed (see start_checks)."""
+        now = time.time()
+        for future, (_, deadline, _, _) in list(self.jobs.items()):
+            if deadline <= now:
+                self._finish_job(future)
+
+    def _record_result(self, test_to_perform, result, duration=0):
+        """Update the test data and schedule the next run of a check."""
+        test_config = self.config["checks"][test_to_perform]
+        self.updated.add(test_to_perform)
+        self.version += 1
+
+        # Don't keep the result of a failed test (zero is a valid result, but
+        # a multi-metric test without metrics failed)
+        if result is False or result is None or result == {}:
+            # Retry the test with an exponential backoff, from the check
+            # interval up to the maximum backoff interval (so a broken test
+            # doesn't run in a tight loop)
+            failure = self.failures.get(test_to_perform)
+            if failure is None:
+                retry_interval = test_config["check_interval"]
+                count = 1
+            else:
+                # Never below the check interval (with a backoff factor
+                # below 1, or a check interval that grew since)
+                retry_interval = max(test_config["check_interval"], min(
+                    test_config["retry_backoff_max"],
+                    failure["retry_interval"] * test_config["retry_backoff"],
+                ))
+                count = failure["count"] + 1
+            run_at = self._schedule(test_to_perform, retry_interval)
+
+            logger.warning("Test failed: %s (%s times, retrying in %s "
+                           "seconds)", test_to_perform, count,
+                           retry_interval)
+            self._remove_results(test_to_perform)
+            self.failures[test_to_perform] = {
+                "count": count,
+                "retry_interval": retry_interval,
+                "last_run": time.time(),
+                "run_at": run_at,
+                "duration": duration,
+            }
             return False
+        self.failures.pop(test_to_perform, None)
 
-        # Add the result to the test data
-        self.test_data[test_to_perform] = {
-            "score": result,
-            "config": self.config["checks"][test_to_perform],
-            "last_run": time.time(),
-            "run_at": time.time() +
-            self.config["checks"][test_to_perform]["check_interval"],
-        }
+        logger.info("Test passed: %s; Output: %s", test_to_perform, result)
+
+        # Get the results to add, as {name: (result, config)} (a multi-metric
+        # test adds an entry per metric, instead of its own entry)
+        if isinstance(result, dict):
+            results = self._metric_results(test_to_perform, result)
+        else:
+            results = {test_to_perform: (result, test_config)}
+
+        # Schedule the next run of the test (an event-driven test is run
+        # again while its result is above the level of its trigger, then it
+        # waits for the next event)
+        if test_to_perform in self.watched and \
+                self.test_instances[test_to_perform].settled(result):
+            self.scheduler.cancel(test_to_perform)
+            run_at = 0
+        else:
+            run_at = self._schedule(
+                test_to_perform,
+                self._next_interval(test_to_perform, results),
+            )
+
+        # Add the results to the test data
+        last_run = time.time()
+        for name, (value, config) in results.items():
+            self.updated.add(name)
+            self.test_data[name] = {
+                "score": value,
+                "config": config,
+                "last_run": last_run,
+                "run_at": run_at,
+                "duration": duration,
+            }
+            self.score_engine.update(name, self.test_data[name])
+
+            # Add the result to the history
+            if self.history is not None:
+                self.history.append(name, last_run, value, test_to_perform)
 
         # Return the result
         return result
 
+    def _metric_results(self, test_to_perform, result):
+        """Get the test data names and configs of the metrics of a test."""
+        # The test isn't reported itself (its metrics are)
+        self.updated.discard(test_to_perform)
+        if test_to_perform in self.test_data:
+            self._remove_result(test_to_perform)
+
+        results = {
+            test_to_perform + METRIC_SEPARATOR + metric:
+            (value, self._metric_config(test_to_perform, metric))
+            for metric, value in result.items()
+        }
+
+        # Remove the metrics that the test doesn't return anymore
+        for name in self.metrics.get(test_to_perform, set()) - \
+                results.keys():
+            self._remove_result(name)
+        self.metrics[test_to_perform] = set(results)
+        return results
+
+    def _metric_config(self, test_to_perform, metric):
+        """Get the config of a metric of a multi-metric test.
+
+        The config of the test is overridden by the entries of its "metrics"
+        config whose pattern (like "*" or "*:io") matches the metric, in
+        order.
+        """
+        configs = self.metric_configs.setdefault(test_to_perform, {})
+        if metric not in configs:
+            test_config = self.config["checks"][test_to_perform]
+            config = dict(test_config)
+            for pattern, overrides in test_config["metrics"].items():
+                if fnmatch.fnmatchcase(metric, pattern):
+                    config.update(overrides)
+            configs[metric] = config
+        return configs[metric]
+
+    def _remove_result(self, name):
+        """Remove a result from the test data and the score."""
+        if self.test_data.pop(name, None) is not None:
+            self.score_engine.remove(name)
+            self.updated.add(name)
+
+    def _remove_results(self, test_to_perform):
+        """Remove the results of a test (and of its metrics)."""
+        self._remove_result(test_to_perform)
+        for name in self.metrics.pop(test_to_perform, ()):
+            self._remove_result(name)
+
+    def _schedule(self, test_to_perform, interval):
+        """Schedule the next run of a check, and return its deadline."""
+        now = time.time()
+        if self.config["global"]["scheduler"]["spread"]:
+            # Spread the checks over their check interval
+            run_at = self.scheduler.next_run_at_spread(
+                test_to_perform,
+                now,
+                interval,
+                self.config["checks"][test_to_perform]["check_interval"],
+            )
+        else:
+            run_at = now + interval
+        self.scheduler.schedule(test_to_perform, run_at)
+        return run_at
+
+    def _next_interval(self, test_to_perform, results):
+        """Get the interval before the next run of a check that passed.
+
+        The results are the {name: (result, config)} entries of the check
+        (see _record_result).
+        """
+        test_config = self.config["checks"][test_to_perform]
+        if not test_config["adaptive"]:
+            return test_config["check_interval"]
+
+        # Adapt the interval to the change since the previous result (the
+        # interval of a multi-metric test is the shortest of its metrics)
+        current = self.intervals.get(test_to_perform,
+                                     test_config["check_interval"])
+        interval = min(
+            healthcheck.adaptive.next_interval(
+                current,
+                self.test_data[name]["score"] if name in self.test_data
+                else None,
+                value,
+                config,
+            )
+            for name, (value, config) in results.items()
+        )
+        if interval != self.intervals.get(test_to_perform):
+            logger.debug("Interval of %s: %s seconds", test_to_perform,
+                         interval)
+        self.intervals[test_to_perform] = interval
+        return interval
+
+    def run_check(self, test_to_perform):
+        """Run a single check and update the test data."""
+        return self.run_checks([test_to_perform]).get(test_to_perform)
+
     def run_all(self):
-        """Run the health check."""
-        # Initialize the score dictionary
-        score_list = {}
+        """Run the health check.
 
+        This is the synchronous API (used by the scripts): run_all runs all
+        the checks and waits for them, then run_needed runs the checks that
+        are due. The daemon starts the checks without waiting for them
+        instead (see start_checks and start_needed).
+        """
         # Run the tests
-        for test_to_perform in self.config["checks_to_perform"]:
-            # Run the test
-            if not self.run_check(test_to_perform):
-                # If the test failed, don't set the score, and remove the test
-                # from the test data (if it exists)
-                if test_to_perform in self.test_data:
-                    del self.test_data[test_to_perform]
-                continue
-
-            # Add the result to the score list (we copy the test data, because
-            # the test data has the score list field, and more)
-            score_list[test_to_perform] = self.test_data[test_to_perform]
+        self.run_checks(self.config["checks_to_perform"])
 
         # Reload the score
         self.reload_score()
@@ -181,49 +657,17 @@ class TestManager:
         return self.score
 
     def run_needed(self):
-        """Run tests that need to be re-run."""
-        # Disable logging for this function (it's called a lot)
-        logging.disable(logging.CRITICAL)
-
+        """Run tests that need to be re-run (after run_all, see run_all)."""
         # Check if the manager is ready
         if not self.ready:
             return False
 
-        # Initialize the score dictionary
-        score_list = {}
+        # Nothing to do, the score didn't change
+        if not (tests_to_perform := self._pop_due()):
+            return self.score
 
         # Run the tests
-        for test_to_perform in self.config["checks_to_perform"]:
-            # Ensure the test config exists
-            if test_to_perform not in self.config["checks"]:
-                # logger.warning("Test config not found: %s", test_to_perform)
-                continue
-
-            # Check if the test is in the test data (if not, run it)
-            # TODO: Don't rerun tests that failed (or add a timeout before
-            # rerunning them)
-            if test_to_perform not in self.test_data:
-                # Run the test
-                if not self.run_check(test_to_perform):
-                    # If the test failed, don't set the score, and remove the
-                    # test from the test data (if it exists)
-                    if test_to_perform in self.test_data:
-                        del self.test_data[test_to_perform]
-                    continue
-
-                # Add the result to the score list (we copy the test data,
-                # because the test data has the score list field, and more)
-                score_list[test_to_perform] = self.test_data[test_to_perform]
-                continue
-
-            # Check if the test needs to be run
-            if self.test_data[test_to_perform]["run_at"] < time.time():
-                # Run the test
-                self.run_check(test_to_perform)
-
-            # Add the result to the score list (we copy the test data, because
-            # the test data has the score list field, and more)
-            score_list[test_to_perform] = self.test_data[test_to_perform]
+        self.run_checks(tests_to_perform)
 
         # Reload the score
         self.reload_score()
@@ -231,15 +675,125 @@ class TestManager:
         # Log the score
         logger.info("Score: %s", self.score)
 
-        # Restore the logging level
-        logging.disable(logging.NOTSET)
-
         # Return the score
         return self.score
 
+    def start_needed(self, defer, callback=None):
+        """Start the tests that need to be re-run (see start_checks)."""
+        # Finish the jobs that are past their deadline (their tests are
+        # scheduled again)
+        self.expire_jobs()
+        self.start_checks(self._pop_due(), defer, callback)
+
+    def _pop_due(self):
+        """Get the tests whose deadline has passed (and that are enabled)."""
+        return [
+            test for test in self.scheduler.pop_due()
+            if test in self.enabled
+        ]
+
+    def watches(self):
+        """Get the file descriptors of the event-driven checks.
+
+        The checks whose test has a watch method (like the PSI pressure
+        tests) are registered, and returned as {name: file descriptor}. The
+        caller runs on_event when a file descriptor is ready, and the check
+        is polled until its settled method accepts its result. The tests that
+        can't be watched are polled like the other ones.
+        """
+        # Forget the checks that were disabled
+        for test in list(self.watched):
+            if test not in self.enabled:
+                self.watched.pop(test)
+
+        for test in self.config["checks_to_perform"]:
+            if test in self.watched or test not in self.config["checks"]:
+                continue
+            # Broken tests are reported (and retried) by run_checks
+            try:
+                instance = self.get_test(test)
+                fd = instance.watch() if hasattr(instance, "watch") else None
+            except Exception:
+                logger.exception("Error initializing test: %s", test)
+                continue
+            if fd is not None:
+                logger.info("Watching test: %s", test)
+                self.watched[test] = fd
+        return dict(self.watched)
+
+    def on_event(self, test_to_perform, error=False, defer=None):
+        """Run an event-driven check when its file descriptor is ready.
+
+        If the file descriptor got an error, the check isn't watched
+        anymore, and it's polled instead. The check is started without
+        waiting for it if defer is given (see start_checks).
+        """
+        if error:
+            logger.warning("Watch of %s failed, polling it instead",
+                           test_to_perform)
+            self.watched.pop(test_to_perform, None)
+            if test_to_perform in self.test_instances:
+                self.test_instances[test_to_perform].unwatch()
+
+        # Run the check
+        logger.debug("Event for test: %s", test_to_perform)
+        if defer is not None:
+            self.start_checks([test_to_perform], defer)
+        else:
+            self.run_check(test_to_perform)
+
+        # Reload the score
+        self.reload_score()
+        return self.score
+
+    def take_updated(self):
+        """Get (and reset) the tests that were run since the last call."""
+        updated, self.updated = self.updated, set()
+        return updated
+
+    def snapshot(self):
+        """Get the score and the state of every check.
+
+        The state of a check is a (name, score, last run, next run, duration,
+        failed) tuple, the score of a failed check is -1 (like the global
+        score if it's unknown), and the next run of an event-driven check
+        that waits for an event is 0.
+        """
+        checks = [
+            (test, data["score"], data["last_run"], data["run_at"],
+             data["duration"], False)
+            for test, data in self.test_data.items()
+        ]
+        checks.extend(
+            (test, -1, failure["last_run"], failure["run_at"],
+             failure["duration"], True)
+            for test, failure in self.failures.items()
+        )
+        return (-1 if self.score is None else self.score), checks
+
+    def next_run_at(self):
+        """Get the time at which run_needed has work to do (or None).
+
+        The deadlines of the running jobs are included (see start_needed).
+        """
+        deadlines = [deadline for _, deadline, _, _ in self.jobs.values()]
+        if (run_at := self.scheduler.next_run_at()) is not None:
+            deadlines.append(run_at)
+        return min(deadlines, default=None)
+
     def reload_score(self):
         """Reload the score."""
-        self.score = healthcheck.score.calculate(self.test_data, self.config)
+        # The engine only recomputes the score if a test changed
+        self.score = self.score_engine.score()
+
+    def close_test_instance(self, test):
+        """Remove a test instance from the cache, and release its resources."""
+        instance = self.test_instances.pop(test)
+        self.watched.pop(test, None)
+
+        # Tests can hold threads, files, etc. (close is optional)
+        if hasattr(instance, "close"):
+            instance.close()
 
     def set_config(self, config):
         """Set the config."""
@@ -256,14 +810,52 @@ class TestManager:
                 continue
             logger.info("Resetting test data for: %s", test)
             # Else, reset the test data and instance
-            if test in self.test_data:
-                del self.test_data[test]
-            else:
-                logger.debug("Test data not found: %s", test)
+            self.failures.pop(test, None)
+            self.intervals.pop(test, None)
+            self.metric_configs.pop(test, None)
+            self.version += 1
+            self._remove_results(test)
             if test in self.test_instances:
-                del self.test_instances[test]
+                self.close_test_instance(test)
             else:
                 logger.debug("Test instance not found: %s", test)
+            # Run the test as soon as possible with the new config
+            self.scheduler.schedule(test, time.time())
+
+        # Check if the worker pool config changed
+        workers_changed = \
+            self.config["global"]["workers"] != config["global"]["workers"]
 
         # Save the new config
         self.config = copy.deepcopy(config)
+        self.enabled = set(self.config["checks_to_perform"])
+        self.score_engine.set_config(self.config)
+
+        # Free the history of the checks that were removed
+        if self.history is not None:
+            self.history.retain(self.config["checks_to_perform"])
+
+        # Recreate the worker pool with the new config
+        if workers_changed:
+            logger.info("Recreating the worker pool")
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.running.clear()
+            self.executor = self._create_executor()
+
+        # Schedule the tests that were added to the tests to perform
+        for test in self.config["checks_to_perform"]:
+            if test not in self.scheduler:
+                self.scheduler.schedule(test, time.time())
+
+    def close(self):
+        """Stop the worker pool and release the test instances."""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        for test in list(self.test_instances):
+            self.close_test_instance(test)
+
+        # Stop the command worker
+        healthcheck.command_worker.stop()
+
+        # Save the history
+        if self.history is not None:
+            self.history.close()
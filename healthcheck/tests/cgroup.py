@@ -0,0 +1,195 @@
+"""Health Check - A simple health check script for your server."""
+
+# This file is part of the healthcheck package.
+#
+# The healthcheck package is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# The healthcheck package is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# the healthcheck package.  If not, see <http://www.gnu.org/licenses/>.
+
+# Standard library imports
+import logging
+import glob
+import os
+import time
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Values that the test returns for each cgroup (as "<path>:<metric>")
+METRICS = ("memory", "cpu", "io")
+
+
+def _read(dir_fd, name):
+    """Read a file of a cgroup directory (None if it doesn't exist)."""
+    try:
+        fd = os.open(name, os.O_RDONLY, dir_fd=dir_fd)
+    except FileNotFoundError:
+        # The controller isn't enabled for the cgroup
+        return None
+    try:
+        return os.read(fd, 65536)
+    finally:
+        os.close(fd)
+
+
+def _delta(value, previous):
+    """Get the increase of a counter since its previous value.
+
+    The counters are reset when the cgroup is created again (like a
+    restarted service): a counter that went backwards counts from zero.
+    """
+    if value < previous:
+        return value
+    return value - previous
+
+
+def _own_cgroup():
+    """Get the path of the cgroup of this process (cgroup v2)."""
+    with open("/proc/self/cgroup", "rb") as file:
+        for line in file:
+            # The cgroup v2 line is "0::<path>"
+            if line.startswith(b"0::"):
+                return line[3:].strip().decode()
+    return "/"
+
+
+class Test:
+    """Test class that checks the resources used by cgroups (cgroup v2).
+
+    For each cgroup of cgroup_paths (relative to cgroup_root, with glob
+    patterns, "." being the cgroup of the daemon), the test returns the
+    memory usage (percent of memory.max, or of the system memory if there
+    is no limit), the CPU usage (percent of the cpu.max quota, or of all
+    the CPUs) and the IO throughput (bytes per second). The CPU and IO
+    usages are computed from the previous run, so they're returned from the
+    second run.
+    """
+
+    def __init__(self, config):
+        """Initialize the test."""
+        self.config = config
+
+        # Counters of the previous run, as {path: (time, CPU usage in
+        # microseconds, IO bytes)}
+        self._previous = {}
+
+        # Memory and CPUs of the system (for the cgroups without limit)
+        self._memory = os.sysconf("SC_PAGE_SIZE") * \
+            os.sysconf("SC_PHYS_PAGES")
+        self._cpus = os.cpu_count() or 1
+        logger.debug("Initializing test: %s", __name__)
+
+    def paths(self, root):
+        """Get the paths of the cgroups to check (relative to the root)."""
+        paths = []
+        for path in self.config["cgroup_paths"]:
+            if path == ".":
+                path = _own_cgroup()
+            path = path.strip("/")
+            if glob.has_magic(path):
+                paths.extend(
+                    os.path.relpath(match, root)
+                    for match in sorted(glob.glob(os.path.join(root, path)))
+                    if os.path.isdir(match)
+                )
+            else:
+                paths.append(path or ".")
+        return paths
+
+    def run(self, snapshot=None):
+        """Run the test."""
+        logger.debug("Running test: %s", __name__)
+
+        root = self.config["cgroup_root"]
+        try:
+            root_fd = os.open(root, os.O_RDONLY | os.O_DIRECTORY)
+        except OSError as error:
+            logger.error("Could not open the cgroup root: %s", error)
+            return False
+
+        # Read all the cgroups in one pass, with raw system calls relative
+        # to the cgroup root
+        results = {}
+        previous = {}
+        try:
+            for path in self.paths(root):
+                try:
+                    dir_fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY,
+                                     dir_fd=root_fd)
+                except OSError:
+                    # The cgroup was removed (or doesn't exist yet)
+                    logger.debug("Cgroup not found: %s", path)
+                    continue
+                try:
+                    now = time.monotonic()
+                    self._check(path, dir_fd, now, results, previous)
+                except OSError as error:
+                    logger.debug("Could not read cgroup %s: %s", path, error)
+                finally:
+                    os.close(dir_fd)
+        finally:
+            os.close(root_fd)
+
+        # Forget the cgroups that are gone
+        self._previous = previous
+        if not results and all(usage is None and io_bytes is None
+                               for _, usage, io_bytes in previous.values()):
+            logger.error("No cgroup found in %s (is cgroup v2 mounted "
+                         "there?): %s", root, self.config["cgroup_paths"])
+        return results
+
+    def _check(self, path, dir_fd, now, results, previous):
+        """Add the metrics of a cgroup to the results."""
+        # Memory usage
+        current = _read(dir_fd, "memory.current")
+        if current is not None:
+            limit = _read(dir_fd, "memory.max").strip()
+            limit = self._memory if limit == b"max" else int(limit)
+            results[f"{path}:memory"] = int(current) / limit * 100
+
+        # CPU usage, in microseconds ("usage_usec" is the first line)
+        cpu_stat = _read(dir_fd, "cpu.stat")
+        usage = int(cpu_stat.split(None, 2)[1]) if cpu_stat else None
+
+        # IO bytes, summed over the devices (lines like "8:0 rbytes=1
+        # wbytes=2 rios=3 wios=4 ...")
+        io_stat = _read(dir_fd, "io.stat")
+        io_bytes = None
+        if io_stat is not None:
+            io_bytes = 0
+            for field in io_stat.split():
+                if field.startswith((b"rbytes=", b"wbytes=")):
+                    io_bytes += int(field[7:])
+
+        previous[path] = (now, usage, io_bytes)
+        if path not in self._previous:
+            return
+        then, previous_usage, previous_io_bytes = self._previous[path]
+        elapsed = now - then
+        if elapsed <= 0:
+            return
+
+        # CPU usage (the counters can be reset, see _delta)
+        if usage is not None and previous_usage is not None:
+            # Quota of CPUs ("max" or "<quota> <period>")
+            cpus = self._cpus
+            cpu_max = _read(dir_fd, "cpu.max")
+            if cpu_max is not None and not cpu_max.startswith(b"max"):
+                quota, period = cpu_max.split()
+                cpus = int(quota) / int(period)
+            results[f"{path}:cpu"] = \
+                _delta(usage, previous_usage) / 1e6 / elapsed / cpus * 100
+
+        # IO throughput
+        if io_bytes is not None and previous_io_bytes is not None:
+            results[f"{path}:io"] = \
+                _delta(io_bytes, previous_io_bytes) / elapsed
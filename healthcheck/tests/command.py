@@ -17,66 +17,374 @@
 
 # Standard library imports
 import logging
+import asyncio
+import os
+import signal
 import subprocess
 import re
+import threading
+
+# Import the command worker
+import healthcheck.command_worker
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
+# Size of the chunks read when streaming the output of a command
+STREAM_CHUNK_SIZE = 65536
+
 
 class Test:
-    """Special test class that run commands."""
+    """Special test class that run commands (or Python snippets)."""
 
-    def __init__(self, name, command, command_run_language, regex=None):
+    def __init__(self, name, command, command_run_language, regex=None,
+                 python=False, stream=False, timeout=None):
         """Initialize the test."""
         self.name = name
         self.command = command
         self.command_run_language = command_run_language
         self.regex = regex
+
+        # Timeout of the runs that aren't given one (see run)
+        self.timeout = timeout
+
+        # Compile the regex once (a string is a chain of one regex)
+        if isinstance(regex, str):
+            regex = [regex]
+        self.patterns = [re.compile(pattern) for pattern in regex or ()]
+
+        # Read the output line by line, and stop the command once the regex
+        # chain matches a line
+        self.stream = stream and bool(self.patterns)
+
+        # Filter for the blocks of lines (see match_lines): the first regex,
+        # with ^ and $ matching at each line. It isn't used if the regex is
+        # anchored to the whole string (\A, \Z), a block would miss lines
+        self._block_filter = None
+        if self.stream and not re.search(r"\\[AZ]",
+                                         self.patterns[0].pattern):
+            self._block_filter = re.compile(
+                self.patterns[0].pattern,
+                self.patterns[0].flags | re.MULTILINE,
+            )
+
+        # The named groups of the last regex (other than "value") are the
+        # metrics of the test (several results from one run)
+        self.metrics = []
+        if self.patterns:
+            self.metrics = [
+                group for group in self.patterns[-1].groupindex
+                if group != "value"
+            ]
+
+        # Python snippets run in a snippet host (see command_worker), which
+        # keeps their variables between runs
+        self.python = python
         logger.debug(
             "Initializing test: %s with command: %s",
             self.name,
             self.command
         )
 
+    def run_python(self, timeout):
+        """Run the Python snippet of the test (it's killed on timeout)."""
+        status, output = healthcheck.command_worker.run_snippet(
+            self.name, self.command, timeout
+        )
+        return self._parse_reply(status, output, timeout)
+
+    def run_worker(self, worker, timeout):
+        """Run the test in the command worker."""
+        logger.debug("Running test in the command worker: %s", self.name)
+        status, output = worker.run(
+            "python" if self.python else "command",
+            self.name,
+            self.command,
+            self.command_run_language,
+            timeout,
+        )
+        return self._parse_reply(status, output, timeout)
+
+    def _parse_reply(self, status, output, timeout):
+        """Parse the (status, output) reply of the worker or snippet host."""
+        if status == "timeout":
+            logger.warning("Command timed out after %s seconds: %s",
+                           timeout, self.command)
+            return False
+        if status == "error":
+            returncode, output = output.split(": ", 1)
+            logger.warning("Command failed with error code: %s", returncode)
+            logger.warning("Command output: %s", output)
+            return False
+        if status != "ok":
+            logger.error("Error running test %s: %s", self.name, output)
+            return False
+
+        # Parse the output
+        return self.parse(output)
+
     def run(self):
         """Run the test."""
         logger.debug("Running test: %s", self.name)
         logger.debug("Command: %s", self.command)
 
-        # Run the command
+        # Run the Python snippet
+        if self.python:
+            return self.run_python(self.timeout)
+
+        # Stream the output of the command
+        if self.stream:
+            return self.run_stream()
+
+        # Run the command in its own session, so we can kill the whole
+        # process group (the shell and its children) on timeout
+        with subprocess.Popen(
+            self.command,
+            shell=True,
+            stdout=subprocess.PIPE,
+            universal_newlines=True,
+            env={"LANG": self.command_run_language},
+            start_new_session=True,
+        ) as process:
+            try:
+                output, _ = process.communicate(timeout=self.timeout)
+            except subprocess.TimeoutExpired:
+                logger.warning("Command timed out after %s seconds: %s",
+                               self.timeout, self.command)
+                _kill(process)
+                process.communicate()
+                return False
+        if process.returncode:
+            logger.warning("Command failed with error code: %s",
+                           process.returncode)
+            logger.warning("Command output: %s", output)
+            return False
+
+        # Parse the output
+        return self.parse(output)
+
+    def run_stream(self):
+        """Run the command, and parse its output line by line."""
+        # The command runs in its own session, so we can kill the whole
+        # process group once the regex chain matches
+        process = subprocess.Popen(
+            self.command,
+            shell=True,
+            stdout=subprocess.PIPE,
+            env={"LANG": self.command_run_language},
+            start_new_session=True,
+        )
+
+        # The output is read without timeout, a timer kills the command at
+        # its deadline instead (the read then stops at the end of the output)
+        timed_out = threading.Event()
+
+        def expire():
+            """Kill the command at its deadline."""
+            timed_out.set()
+            _kill(process)
+
+        timer = threading.Timer(self.timeout, expire)
+        if self.timeout is not None:
+            timer.start()
+        with process:
+            lines = _Lines()
+            while chunk := process.stdout.read1(STREAM_CHUNK_SIZE):
+                if (match := self.match_lines(lines.feed(chunk))) \
+                        is not None:
+                    logger.debug("Regex chain matched, stopping: %s",
+                                 self.command)
+                    timer.cancel()
+                    _kill(process)
+                    return self.convert(match)
+            timer.cancel()
+            if (match := self.match_lines(lines.rest())) is not None:
+                return self.convert(match)
+
+        if timed_out.is_set():
+            logger.warning("Command timed out after %s seconds: %s",
+                           self.timeout, self.command)
+            return False
+        if process.returncode:
+            logger.warning("Command failed with error code: %s",
+                           process.returncode)
+            return False
+        logger.error("Regex chain not found in the output: %s", self.command)
+        return False
+
+    async def run_async(self, timeout):
+        """Run the test without blocking the event loop."""
+        logger.debug("Running test: %s", self.name)
+        logger.debug("Command: %s", self.command)
+
+        # Python snippets wait for their snippet host in a thread
+        if self.python:
+            return await asyncio.to_thread(self.run_python, timeout)
+
+        # Start the command in its own session, so we can kill the whole
+        # process group (the shell and its children) on timeout
+        process = await asyncio.create_subprocess_shell(
+            self.command,
+            stdout=asyncio.subprocess.PIPE,
+            env={"LANG": self.command_run_language},
+            start_new_session=True,
+        )
+
+        # Read the output
         try:
-            output = subprocess.check_output(
-                self.command,
-                shell=True,
-                universal_newlines=True,
-                env={"LANG": self.command_run_language}
+            if self.stream:
+                return await asyncio.wait_for(
+                    self._parse_stream(process),
+                    timeout
+                )
+            output, _ = await asyncio.wait_for(
+                process.communicate(),
+                timeout
             )
-        except subprocess.CalledProcessError as error:
+        except asyncio.TimeoutError:
+            logger.warning("Command timed out after %s seconds: %s",
+                           timeout, self.command)
+            _kill(process)
+            await process.wait()
+            return False
+        except asyncio.CancelledError:
+            # The run was cancelled (see command_runner), kill the command
+            _kill(process)
+            await process.wait()
+            raise
+
+        output = output.decode(errors="replace")
+        if process.returncode:
             logger.warning("Command failed with error code: %s",
-                         error.returncode)
-            logger.warning("Command output: %s", error.output)
+                           process.returncode)
+            logger.warning("Command output: %s", output)
             return False
 
-        # Convert the output to a string
-        # output = output.decode("utf-8")
+        # Parse the output
+        return self.parse(output)
 
-        if self.regex:
-            # Iterate over regex
-            for regex in self.regex:
-                if match := re.search(regex, output):
-                    output = match[0]
-                    logger.debug("Regex found: %s; output: %s", regex, output)
+    async def _parse_stream(self, process):
+        """Parse the output of a command line by line (see run_stream)."""
+        lines = _Lines()
+        while chunk := await process.stdout.read(STREAM_CHUNK_SIZE):
+            if (match := self.match_lines(lines.feed(chunk))) is not None:
+                logger.debug("Regex chain matched, stopping: %s",
+                             self.command)
+                _kill(process)
+                await process.wait()
+                return self.convert(match)
 
-                else:
-                    logger.error("Regex not found: %s", regex)
-                    return False
-        # Parse the output to a float
-        try:
-            output = float(output)
-        except ValueError:
-            logger.error("Could not parse output: %s", output)
+        await process.wait()
+        if (match := self.match_lines(lines.rest())) is not None:
+            return self.convert(match)
+        if process.returncode:
+            logger.warning("Command failed with error code: %s",
+                           process.returncode)
             return False
+        logger.error("Regex chain not found in the output: %s", self.command)
+        return False
+
+    def match(self, output):
+        """Apply the regex chain to the output, and return the last match.
+
+        Each regex is searched in the text matched by the previous one (its
+        "value" group if it has one, else the whole match). None is returned
+        if a regex isn't found.
+        """
+        match = None
+        for pattern in self.patterns:
+            if match is not None:
+                output = _value(match)
+            if (match := pattern.search(output)) is None:
+                logger.debug("Regex not found: %s", pattern.pattern)
+                return None
+        return match
+
+    def match_lines(self, output):
+        """Apply the regex chain to each line of the output (first match)."""
+        # Most blocks of lines don't match the first regex, they're skipped
+        # without splitting them
+        if not output or self._block_filter is not None and \
+                self._block_filter.search(output) is None:
+            return None
+        for line in output.splitlines():
+            if (match := self.match(line)) is not None:
+                return match
+        return None
+
+    def convert(self, match):
+        """Convert the last match of the regex chain to the result.
+
+        The result is a float, or a dict of floats for the tests with
+        metrics (the metrics that aren't numbers are left out).
+        """
+        if not self.metrics:
+            return _to_float(_value(match))
+
+        metrics = {}
+        for metric in self.metrics:
+            if (value := match[metric]) is None:
+                continue
+            try:
+                metrics[metric] = float(value)
+            except ValueError:
+                logger.error("Could not parse metric %s: %s", metric, value)
+        return metrics
+
+    def parse(self, output):
+        """Parse the output of the command."""
+        if not self.patterns:
+            return _to_float(output)
+
+        # Apply the regex chain line by line when streaming
+        if (match := self.match_lines(output) if self.stream
+                else self.match(output)) is not None:
+            logger.debug("Regex chain matched: %s", match[0])
+            return self.convert(match)
+
+        logger.error("Regex chain not found in the output: %s", self.command)
+        return False
+
+
+class _Lines:
+    """Split a stream of bytes into blocks of complete lines."""
+
+    def __init__(self):
+        """Initialize the splitter."""
+        self._partial = b""
+
+    def feed(self, chunk):
+        """Add a chunk, and return the complete lines it ends (as a str)."""
+        data = self._partial + chunk
+        end = data.rfind(b"\n") + 1
+        self._partial = data[end:]
+        return data[:end].decode(errors="replace")
+
+    def rest(self):
+        """Return the last line (if the output doesn't end with a newline)."""
+        rest, self._partial = self._partial, b""
+        return rest.decode(errors="replace")
+
+
+def _kill(process):
+    """Kill a command started in its own session (and its children)."""
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def _to_float(output):
+    """Parse an output to a float (False if it isn't a number)."""
+    try:
+        return float(output)
+    except ValueError:
+        logger.error("Could not parse output: %s", output)
+        return False
+
 
-        # Return the output
-        return output
+def _value(match):
+    """Get the text of a match (its "value" group if it has one)."""
+    if "value" in match.re.groupindex:
+        return match["value"]
+    return match[0]
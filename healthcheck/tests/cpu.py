@@ -17,12 +17,75 @@
 
 # Standard library imports
 import logging
+import collections
+import threading
 import psutil
 
+# Import the shared system data
+import healthcheck.snapshot
+
 # Set up logging
 logger = logging.getLogger(__name__)
 
 
+def _cpu_sample(times=None):
+    """Get the cumulative busy and total CPU times."""
+    if times is None:
+        times = psutil.cpu_times()
+
+    # Compute the times the same way as psutil.cpu_percent (guest times are
+    # already accounted in user and nice, and iowait is not busy time)
+    total = sum(times)
+    total -= getattr(times, "guest", 0)
+    total -= getattr(times, "guest_nice", 0)
+    busy = total - times.idle - getattr(times, "iowait", 0)
+    return busy, total
+
+
+def _cpu_percent(first, last):
+    """Compute the CPU load between two samples."""
+    busy = last[0] - first[0]
+    total = last[1] - first[1]
+
+    # The counters didn't move (samples taken too close to each other)
+    if total <= 0:
+        return 0.0
+
+    # Ensure the load is between 0 and 100 (counters may go backwards a bit)
+    return round(max(0.0, min(100.0, busy / total * 100)), 1)
+
+
+class Sampler(threading.Thread):
+    """Background thread that keeps a sliding window of CPU samples."""
+
+    def __init__(self, interval, window):
+        """Initialize the sampler."""
+        super().__init__(name="cpu-sampler", daemon=True)
+        self.interval = interval
+
+        # Keep one more sample than the window, because the load is the
+        # difference between the first and the last sample
+        self.samples = collections.deque(
+            [_cpu_sample()],
+            maxlen=max(2, int(window / interval) + 1)
+        )
+        self._stop_event = threading.Event()
+
+    def run(self):
+        """Sample the CPU times until stopped."""
+        while not self._stop_event.wait(self.interval):
+            self.samples.append(_cpu_sample())
+
+    def stop(self):
+        """Stop the sampler."""
+        self._stop_event.set()
+
+    def percent(self):
+        """Get the CPU load over the window."""
+        # Only the ends of the window are needed, so this is O(1)
+        return _cpu_percent(self.samples[0], self.samples[-1])
+
+
 class Test:
     """Test class that checks the CPU load."""
 
@@ -31,9 +94,38 @@ class Test:
         self.config = config
         logger.debug("Initializing test: %s", __name__)
 
-    def run(self):
+        # Start from the boot (cumulative times are zero at boot), so the
+        # first run returns the average load since boot instead of sleeping
+        self.last_sample = (0, 0)
+
+        # Start the background sampler if enabled
+        self.sampler = None
+        if self.config["cpu_sampler"]:
+            self.sampler = Sampler(
+                self.config["cpu_sample_interval"],
+                self.config["cpu_sample_window"],
+            )
+            self.sampler.start()
+
+    def run(self, snapshot=None):
         """Run the test."""
         logger.debug("Running test: %s", __name__)
 
-        # Return the CPU load
-        return psutil.cpu_percent(interval=self.config["cpu_test_duration"])
+        # Read the system data if it's not shared by the test manager
+        if snapshot is None:
+            snapshot = healthcheck.snapshot.Snapshot()
+
+        # Return the CPU load over the sampler window
+        if self.sampler is not None:
+            return self.sampler.percent()
+
+        # Return the CPU load since the last run
+        sample = _cpu_sample(snapshot.cpu_times())
+        load = _cpu_percent(self.last_sample, sample)
+        self.last_sample = sample
+        return load
+
+    def close(self):
+        """Stop the background sampler."""
+        if self.sampler is not None:
+            self.sampler.stop()
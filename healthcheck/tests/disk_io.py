@@ -17,40 +17,80 @@
 
 # Standard library imports
 import logging
+import collections
+import time
 import psutil
 
+# Import the shared system data
+import healthcheck.snapshot
+
 # Set up logging
 logger = logging.getLogger(__name__)
 
 
 class Test:
-    """Test class that checks the disk read/write data."""
+    """Test class that checks the disk read/write throughput."""
 
     def __init__(self, config):
         """Initialize the test."""
         self.config = config
-        self.last_run_list = []
+
+        # Keep the (timestamp, counters) samples of the compare interval (one
+        # more sample than the interval, because the throughput is the
+        # difference between the first and the last sample)
+        compare_interval = self.config["compare_interval"]
+        check_interval = self.config["check_interval"]
+        self.samples = collections.deque(
+            maxlen=max(2, int(compare_interval / check_interval) + 1)
+        )
+
+        # The counters are zero at boot, so the first run returns the
+        # average throughput since boot (the boot sample has no counters)
+        self.samples.append((psutil.boot_time(), None))
 
         logger.debug("Initializing test: %s", __name__)
 
-    def run(self):
+    def _counters(self, snapshot):
+        """Get the read + write bytes counters (per disk if needed)."""
+        if self.config["perdisk"]:
+            return {
+                disk: counters.read_bytes + counters.write_bytes
+                for disk, counters in
+                snapshot.disk_io_counters(perdisk=True).items()
+            }
+
+        disk_io = snapshot.disk_io_counters(perdisk=False)
+        return {None: disk_io.read_bytes + disk_io.write_bytes}
+
+    def run(self, snapshot=None):
         """Run the test."""
         logger.debug("Running test: %s", __name__)
 
-        # Get the disk I/O data
-        disk_io = psutil.disk_io_counters(perdisk=False)
-
-        # Add the read and write data to get the total
-        total = disk_io.read_bytes + disk_io.write_bytes
+        # Read the system data if it's not shared by the test manager
+        if snapshot is None:
+            snapshot = healthcheck.snapshot.Snapshot()
 
-        # Add the total to the last run list
-        self.last_run_list.append(total)
+        # Add the sample (the oldest one is dropped by the deque)
+        timestamp = time.time()
+        counters = self._counters(snapshot)
+        self.samples.append((timestamp, counters))
 
-        # Remove the oldest entry if the list is too long
-        compare_interval = self.config["compare_interval"]
-        check_interval = self.config["check_interval"]
-        while len(self.last_run_list) > compare_interval / check_interval:
-            self.last_run_list.pop(0)
+        # Compute the throughput of every disk over the compare interval (a
+        # counter that went backwards was reset, it's ignored). The disks
+        # that aren't in the first sample appeared since then (hot-plug),
+        # their counters aren't since the first sample, they're skipped
+        first_timestamp, first_counters = self.samples[0]
+        elapsed = timestamp - first_timestamp
+        if elapsed <= 0:
+            return 0.0
+        if first_counters is None:
+            first_counters = dict.fromkeys(counters, 0)
+        rates = [
+            max(0, counter - first_counters[disk]) / elapsed
+            for disk, counter in counters.items()
+            if disk in first_counters
+        ]
 
-        # Return the average
-        return sum(self.last_run_list) / len(self.last_run_list)
+        # Return the throughput in bytes per second (of the busiest disk in
+        # per disk mode)
+        return max(rates, default=0.0)
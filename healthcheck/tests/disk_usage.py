@@ -17,11 +17,45 @@
 
 # Standard library imports
 import logging
-import psutil
+import fnmatch
+import os
+import re
+import select
+
+# Import the shared system data
+import healthcheck.snapshot
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
+# Mount table of this process (polled for changes)
+MOUNTINFO_PATH = "/proc/self/mountinfo"
+
+
+def _unescape(field):
+    """Decode a field of mountinfo (spaces, tabs, etc. are octal escapes)."""
+    return re.sub(r"\\([0-7]{3})", lambda match: chr(int(match[1], 8)),
+                  field)
+
+
+def parse_mountinfo(data):
+    """Parse mountinfo, and return the (mount point, fstype, device) list.
+
+    Lines are like "36 35 98:0 /mnt1 /mnt2 rw,noatime master:1 - ext3
+    /dev/root rw,errors=continue": the mount point is the fifth field, and
+    the filesystem type is the first field after the "-" separator.
+    """
+    mounts = []
+    for line in data.decode(errors="surrogateescape").splitlines():
+        fields = line.split()
+        try:
+            separator = fields.index("-", 6)
+        except ValueError:
+            continue
+        mounts.append((_unescape(fields[4]), fields[separator + 1],
+                       fields[2]))
+    return mounts
+
 
 class Test:
     """Test class that checks the disk usage."""
@@ -29,14 +63,107 @@ class Test:
     def __init__(self, config):
         """Initialize the test."""
         self.config = config
+
+        # Mount table (opened on the first run in mount mode), and the
+        # mounts to check (read again when the mount table changes)
+        self._mountinfo = None
+        self._poll = None
+        self._mounts = None
         logger.debug("Initializing test: %s", __name__)
 
-    def run(self):
+    def __getstate__(self):
+        """Get the state to pickle (for process workers)."""
+        # Files can't be pickled, the mount table is read again
+        state = self.__dict__.copy()
+        state["_mountinfo"] = None
+        state["_poll"] = None
+        state["_mounts"] = None
+        return state
+
+    def run(self, snapshot=None):
         """Run the test."""
         logger.debug("Running test: %s", __name__)
 
+        # Check all the mounts
+        if self.config["disk_mounts"]:
+            return self.run_mounts()
+
+        # Read the system data if it's not shared by the test manager
+        if snapshot is None:
+            snapshot = healthcheck.snapshot.Snapshot()
+
         # Get the disk usage
-        disk_usage = psutil.disk_usage(self.config["disk_test_path"])
+        disk_usage = snapshot.disk_usage(self.config["disk_test_path"])
 
         # Return the disk usage
         return disk_usage.percent
+
+    def mounts(self):
+        """Get the mount points to check.
+
+        The mount table is only parsed again when it changed: the kernel
+        reports changes of mountinfo as POLLPRI (and POLLERR) events.
+        """
+        if self._mountinfo is None:
+            self._mountinfo = open(MOUNTINFO_PATH, "rb")
+            self._poll = select.poll()
+            self._poll.register(self._mountinfo, select.POLLPRI)
+        elif self._mounts is not None and not self._poll.poll(0):
+            return self._mounts
+
+        # Read the mount table (this also acknowledges the change)
+        self._mountinfo.seek(0)
+        mounts = parse_mountinfo(self._mountinfo.read())
+
+        # Filter the mounts, and keep one mount per device (bind mounts
+        # have the same usage)
+        devices = set()
+        self._mounts = []
+        for mount_point, fstype, device in mounts:
+            if fstype in self.config["disk_exclude_fstypes"] or \
+                    device in devices or any(
+                        fnmatch.fnmatchcase(mount_point, pattern)
+                        for pattern in self.config["disk_exclude_mounts"]
+                    ):
+                continue
+            devices.add(device)
+            self._mounts.append(mount_point)
+        logger.debug("Mounts to check: %s", self._mounts)
+        return self._mounts
+
+    def run_mounts(self):
+        """Get the usage (and the inode usage) of all the mounts.
+
+        The result has the usage of each mount, the inode usage of each mount
+        ("<mount>:inodes") and the worst of them ("worst").
+        """
+        results = {}
+        for mount_point in self.mounts():
+            try:
+                stat = os.statvfs(mount_point)
+            except OSError as error:
+                logger.debug("Could not check mount %s: %s", mount_point,
+                             error)
+                continue
+
+            # Usage for the unprivileged users, like df and psutil
+            used = stat.f_blocks - stat.f_bfree
+            if total := used + stat.f_bavail:
+                results[mount_point] = used / total * 100
+
+            # Some filesystems don't have a fixed number of inodes
+            if stat.f_files:
+                results[f"{mount_point}:inodes"] = \
+                    (stat.f_files - stat.f_ffree) / stat.f_files * 100
+
+        if results:
+            results["worst"] = max(results.values())
+        return results
+
+    def close(self):
+        """Close the mount table."""
+        if self._mountinfo is not None:
+            self._mountinfo.close()
+            self._mountinfo = None
+            self._poll = None
+            self._mounts = None
@@ -0,0 +1,239 @@
+"""Health Check - A simple health check script for your server."""
+
+# This file is part of the healthcheck package.
+#
+# The healthcheck package is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# The healthcheck package is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# the healthcheck package.  If not, see <http://www.gnu.org/licenses/>.
+
+# Standard library imports
+import logging
+import asyncio
+import collections
+import os
+import ssl
+import threading
+import time
+import urllib.parse
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Event loop shared by the endpoint tests, and the process that started it
+# (see _get_loop)
+_loop = None
+_loop_pid = None
+_loop_lock = threading.Lock()
+
+
+def _get_loop():
+    """Get the event loop of the endpoint tests (started if needed).
+
+    The loop runs in a daemon thread for the whole life of the process, so
+    the idle connections of the tests can be reused between runs. A forked
+    process (like a process worker) starts its own loop, the thread of the
+    parent's loop doesn't exist there.
+    """
+    global _loop, _loop_pid
+    with _loop_lock:
+        if _loop is None or _loop_pid != os.getpid():
+            _loop = asyncio.new_event_loop()
+            _loop_pid = os.getpid()
+            threading.Thread(
+                target=_loop.run_forever,
+                name="endpoint-loop",
+                daemon=True,
+            ).start()
+        return _loop
+
+
+class _Response(Exception):
+    """Error raised when an endpoint returns an invalid response."""
+
+
+class Test:
+    """Test class that checks the latency of TCP and HTTP endpoints.
+
+    All the endpoints (like "tcp://localhost:22" or
+    "http://localhost:8080/health") are probed concurrently, and the test
+    returns the latency of each endpoint in milliseconds (the time to
+    connect for TCP, the time of the request for HTTP). An endpoint that
+    doesn't answer (or answers an HTTP error) gets the timeout as latency.
+    HTTP connections are kept alive and reused by the next runs.
+    """
+
+    def __init__(self, config):
+        """Initialize the test."""
+        self.config = config
+
+        # Idle HTTP connections, as {(host, port, TLS): deque of (reader,
+        # writer)} (at most one per endpoint, as the endpoints are probed
+        # concurrently)
+        self._pool = collections.defaultdict(collections.deque)
+
+        # TLS context (created on the first HTTPS request)
+        self._ssl_context = None
+        logger.debug("Initializing test: %s", __name__)
+
+    def __getstate__(self):
+        """Get the state to pickle (for process workers)."""
+        # Connections can't be pickled, the pool starts empty
+        state = self.__dict__.copy()
+        state["_pool"] = collections.defaultdict(collections.deque)
+        state["_ssl_context"] = None
+        return state
+
+    def run(self, snapshot=None):
+        """Run the test."""
+        logger.debug("Running test: %s", __name__)
+
+        future = asyncio.run_coroutine_threadsafe(self._probe_all(),
+                                                  _get_loop())
+        return future.result()
+
+    async def _probe_all(self):
+        """Probe all the endpoints concurrently."""
+        timeout = self.config["endpoint_timeout"]
+        latencies = await asyncio.gather(*(
+            self._probe(endpoint, timeout)
+            for endpoint in self.config["endpoints"]
+        ))
+        return dict(zip(self.config["endpoints"], latencies))
+
+    async def _probe(self, endpoint, timeout):
+        """Get the latency of an endpoint (the timeout if it failed)."""
+        url = urllib.parse.urlsplit(endpoint)
+        start = time.perf_counter()
+        try:
+            if url.scheme == "tcp":
+                await asyncio.wait_for(self._connect(url), timeout)
+            elif url.scheme in ("http", "https"):
+                await asyncio.wait_for(self._request(url), timeout)
+            else:
+                logger.error("Invalid endpoint: %s", endpoint)
+                return timeout * 1000
+        except asyncio.TimeoutError:
+            logger.warning("Endpoint timed out after %s seconds: %s",
+                           timeout, endpoint)
+            return timeout * 1000
+        except (OSError, EOFError, ValueError, _Response) as error:
+            logger.warning("Endpoint failed: %s (%s)", endpoint, error)
+            return timeout * 1000
+        return (time.perf_counter() - start) * 1000
+
+    async def _connect(self, url):
+        """Open (and close) a TCP connection."""
+        _, writer = await asyncio.open_connection(url.hostname, url.port)
+        writer.close()
+        await writer.wait_closed()
+
+    async def _request(self, url):
+        """Send an HTTP GET request on a pooled connection."""
+        tls = url.scheme == "https"
+        key = (url.hostname, url.port or (443 if tls else 80), tls)
+        path = url.path or "/"
+        if url.query:
+            path += "?" + url.query
+        request = (
+            f"GET {path} HTTP/1.1\r\n"
+            f"Host: {url.netloc}\r\n"
+            "User-Agent: healthcheck\r\n"
+            "Connection: keep-alive\r\n"
+            "\r\n"
+        ).encode()
+
+        # Try an idle connection first, then a new one (the server may have
+        # closed the idle connection)
+        while True:
+            reused = bool(self._pool[key])
+            if reused:
+                reader, writer = self._pool[key].popleft()
+            else:
+                if tls and self._ssl_context is None:
+                    self._ssl_context = ssl.create_default_context()
+                reader, writer = await asyncio.open_connection(
+                    key[0], key[1],
+                    ssl=self._ssl_context if tls else None,
+                )
+            try:
+                status, keep_alive = await self._exchange(reader, writer,
+                                                          request)
+            except (OSError, EOFError) as error:
+                writer.close()
+                if reused:
+                    logger.debug("Idle connection closed: %s", error)
+                    continue
+                raise
+            except BaseException:
+                # Timed out (or invalid response): the connection is in an
+                # unknown state
+                writer.close()
+                raise
+            break
+
+        # Keep the connection for the next run
+        if keep_alive:
+            self._pool[key].append((reader, writer))
+        else:
+            writer.close()
+
+        if status >= 400:
+            raise _Response(f"HTTP status {status}")
+
+    async def _exchange(self, reader, writer, request):
+        """Send a request, and read its response.
+
+        Returns the status of the response, and whether the connection can
+        be reused.
+        """
+        writer.write(request)
+        await writer.drain()
+
+        # Status line, like "HTTP/1.1 200 OK"
+        line = await reader.readline()
+        if not line:
+            raise EOFError("connection closed")
+        version, status = line.split(None, 2)[:2]
+        status = int(status)
+
+        # Headers
+        headers = {}
+        while (line := await reader.readline()) not in (b"\r\n", b"\n"):
+            if not line:
+                raise EOFError("connection closed")
+            name, _, value = line.partition(b":")
+            headers[name.strip().lower()] = value.strip().lower()
+        keep_alive = version == b"HTTP/1.1" and \
+            headers.get(b"connection") != b"close"
+
+        # Body (read, so the connection can be reused)
+        if headers.get(b"transfer-encoding") == b"chunked":
+            while size := int((await reader.readline()).split(b";")[0], 16):
+                await reader.readexactly(size + 2)
+            # Trailers
+            while (line := await reader.readline()) not in (b"\r\n", b"\n"):
+                if not line:
+                    raise EOFError("connection closed")
+        elif b"content-length" in headers:
+            await reader.readexactly(int(headers[b"content-length"]))
+        elif status >= 200 and status not in (204, 304):
+            # Body until the end of the connection
+            await reader.read()
+            keep_alive = False
+        return status, keep_alive
+
+    def close(self):
+        """Close the idle connections."""
+        for connections in self._pool.values():
+            for _, writer in connections:
+                _loop.call_soon_threadsafe(writer.close)
+        self._pool.clear()
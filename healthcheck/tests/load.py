@@ -17,7 +17,9 @@
 
 # Standard library imports
 import logging
-import psutil
+
+# Import the shared system data
+import healthcheck.snapshot
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -31,12 +33,16 @@ class Test:
         self.config = config
         logger.debug("Initializing test: %s", __name__)
 
-    def run(self):
+    def run(self, snapshot=None):
         """Run the test."""
         logger.debug("Running test: %s", __name__)
 
+        # Read the system data if it's not shared by the test manager
+        if snapshot is None:
+            snapshot = healthcheck.snapshot.Snapshot()
+
         # Get the load average
-        load = psutil.getloadavg()
+        load = snapshot.getloadavg()
 
         # Return the load average
         return load[0]
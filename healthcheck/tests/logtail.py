@@ -0,0 +1,224 @@
+"""Health Check - A simple health check script for your server."""
+
+# This file is part of the healthcheck package.
+#
+# The healthcheck package is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# The healthcheck package is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# the healthcheck package.  If not, see <http://www.gnu.org/licenses/>.
+
+# Standard library imports
+import logging
+import collections
+import json
+import os
+import re
+import time
+import zlib
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Size of the blocks read from the log files
+CHUNK_SIZE = 1048576
+
+
+def default_state_path(files, patterns):
+    """Get the default path of the state file of a log-tail check.
+
+    The path depends on the files and the patterns, so two checks that tail
+    the same file keep their own offsets.
+    """
+    state_dir = os.environ.get("XDG_STATE_HOME") or \
+        os.path.join(os.path.expanduser("~"), ".local", "state")
+    digest = zlib.crc32(repr((files, patterns)).encode())
+    return os.path.join(state_dir, "healthcheck", f"logtail-{digest:08x}")
+
+
+class _Tail:
+    """Position in a log file (the file is kept open between runs)."""
+
+    def __init__(self, path, inode=None, offset=None):
+        """Initialize the position (at the end of the file if unknown)."""
+        self.path = path
+        self.inode = inode
+        self.offset = offset
+        self.file = None
+
+    def open(self):
+        """Open the file at the saved offset (False if it doesn't exist)."""
+        try:
+            self.file = open(self.path, "rb")
+        except OSError as error:
+            logger.debug("Could not open log file %s: %s", self.path, error)
+            return False
+        stat = os.fstat(self.file.fileno())
+        if self.inode is None:
+            # First run: the existing lines are skipped
+            self.offset = stat.st_size
+        elif self.inode != stat.st_ino or self.offset > stat.st_size:
+            # New (rotated, or truncated) file: start at its beginning
+            self.offset = 0
+        self.inode = stat.st_ino
+        self.file.seek(self.offset)
+        return True
+
+    def close(self):
+        """Close the file."""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class Test:
+    """Test class that counts the lines of log files that match patterns.
+
+    The files are read from the offset of the previous run, so a run only
+    reads the new lines. The offsets (and the inodes, to detect rotations)
+    are saved in a state file, so they survive restarts. The test returns
+    the number of matching lines in the last log_window seconds.
+    """
+
+    def __init__(self, config):
+        """Initialize the test."""
+        self.config = config
+
+        # Compile the patterns once (a line matches if any pattern matches)
+        self.pattern = re.compile(b"|".join(
+            b"(?:" + pattern.encode() + b")"
+            for pattern in config["log_patterns"]
+        ))
+        self.state_path = config["log_state_file"] or default_state_path(
+            config["log_files"], config["log_patterns"]
+        )
+
+        # Positions in the files, and the (time, count) of the runs in the
+        # window
+        self.tails = {}
+        self.counts = collections.deque()
+        self._load()
+        logger.debug("Initializing test: %s", __name__)
+
+    def __getstate__(self):
+        """Get the state to pickle (for process workers)."""
+        # Files can't be pickled, they're opened again at the saved offsets
+        state = self.__dict__.copy()
+        state["tails"] = {
+            path: _Tail(path, tail.inode, tail.offset)
+            for path, tail in self.tails.items()
+        }
+        return state
+
+    def _load(self):
+        """Load the offsets and the counts of the previous runs."""
+        try:
+            with open(self.state_path, encoding="utf-8") as file:
+                state = json.load(file)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as error:
+            logger.warning("Could not load the log-tail state %s: %s",
+                           self.state_path, error)
+            return
+        for path, (inode, offset) in state.get("files", {}).items():
+            if path in self.config["log_files"]:
+                self.tails[path] = _Tail(path, inode, offset)
+        self.counts.extend(tuple(count) for count in state.get("counts", []))
+
+    def _save(self):
+        """Save the offsets and the counts (replacing the file atomically)."""
+        state = {
+            "files": {
+                path: (tail.inode, tail.offset)
+                for path, tail in self.tails.items()
+            },
+            "counts": list(self.counts),
+        }
+        temporary_path = f"{self.state_path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+            with open(temporary_path, "w", encoding="utf-8") as file:
+                json.dump(state, file)
+            os.replace(temporary_path, self.state_path)
+        except OSError as error:
+            logger.warning("Could not save the log-tail state %s: %s",
+                           self.state_path, error)
+
+    def _count(self, tail):
+        """Count the matching lines written since the previous run."""
+        count = 0
+        partial = b""
+        while chunk := tail.file.read(CHUNK_SIZE):
+            data = partial + chunk
+
+            # Only complete lines are parsed, the last partial line is
+            # parsed with the next chunk (or the next run)
+            end = data.rfind(b"\n") + 1
+            partial = data[end:]
+
+            # Search the next match, and skip the rest of its line (so a
+            # line is only counted once)
+            position = 0
+            while (match := self.pattern.search(data, position, end)):
+                count += 1
+                position = data.find(b"\n", match.end(), end) + 1
+                if not position:
+                    break
+            tail.offset += end
+
+        # Read the partial line again on the next run
+        tail.file.seek(tail.offset)
+        return count
+
+    def run(self, snapshot=None):
+        """Run the test."""
+        logger.debug("Running test: %s", __name__)
+
+        count = 0
+        for path in self.config["log_files"]:
+            tail = self.tails.setdefault(path, _Tail(path))
+            if tail.file is not None:
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    stat = None
+                if stat is not None and stat.st_ino == tail.inode and \
+                        stat.st_size < tail.offset:
+                    # The file was truncated (copytruncate)
+                    logger.info("Log file truncated: %s", path)
+                    tail.offset = 0
+                    tail.file.seek(0)
+
+                # Finish reading the file (if it was rotated, it's still
+                # open), then open the new one
+                count += self._count(tail)
+                if stat is not None and stat.st_ino == tail.inode:
+                    continue
+                logger.info("Log file rotated: %s", path)
+                tail.close()
+            if tail.open():
+                count += self._count(tail)
+
+        # Count the matching lines in the window
+        now = time.time()
+        if count:
+            self.counts.append((now, count))
+        while self.counts and \
+                self.counts[0][0] < now - self.config["log_window"]:
+            self.counts.popleft()
+
+        self._save()
+        return sum(count for _, count in self.counts)
+
+    def close(self):
+        """Close the log files."""
+        for tail in self.tails.values():
+            tail.close()
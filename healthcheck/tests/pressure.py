@@ -0,0 +1,142 @@
+"""Health Check - A simple health check script for your server."""
+
+# This file is part of the healthcheck package.
+#
+# The healthcheck package is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# The healthcheck package is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# the healthcheck package.  If not, see <http://www.gnu.org/licenses/>.
+
+# Standard library imports
+import logging
+import os
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Directory of the pressure stall information (PSI) files
+PRESSURE_PATH = "/proc/pressure"
+
+# Resources, kinds of stall and values that the test can use
+RESOURCES = ("cpu", "memory", "io")
+KINDS = ("some", "full")
+METRICS = ("avg10", "avg60", "avg300")
+
+
+class Test:
+    """Test class that checks the pressure on a resource (PSI).
+
+    The test returns the share of time (in percent) during which some (or
+    all) tasks were stalled on the resource. It can be driven by events: a
+    PSI trigger is registered with watch, and the kernel wakes up the
+    daemon when the tasks are stalled for more than a threshold, so the
+    test doesn't need to be polled.
+    """
+
+    def __init__(self, config):
+        """Initialize the test."""
+        self.config = config
+        self.path = os.path.join(PRESSURE_PATH, config["pressure_resource"])
+
+        # File descriptor of the PSI trigger (see watch)
+        self._trigger = None
+        self._trigger_failed = False
+        logger.debug("Initializing test: %s", __name__)
+
+    def run(self, snapshot=None):
+        """Run the test."""
+        logger.debug("Running test: %s", __name__)
+
+        # Get the values to return
+        kind = self.config["pressure_kind"]
+        metric = self.config["pressure_metric"]
+        if self.config["pressure_resource"] not in RESOURCES or \
+                kind not in KINDS or metric not in METRICS:
+            logger.error("Invalid pressure test: %s %s %s",
+                         self.config["pressure_resource"], kind, metric)
+            return False
+
+        # Read the pressure (lines like "some avg10=0.00 avg60=0.00
+        # avg300=0.00 total=0")
+        try:
+            with open(self.path, "rb") as file:
+                lines = file.read().decode().splitlines()
+        except OSError as error:
+            logger.error("Could not read the pressure: %s", error)
+            return False
+        for line in lines:
+            name, *fields = line.split()
+            if name == kind:
+                values = dict(field.split("=", 1) for field in fields)
+                return float(values[metric])
+
+        logger.error("Pressure not found: %s in %s", kind, self.path)
+        return False
+
+    def watch(self):
+        """Register a PSI trigger, and return its file descriptor.
+
+        The file descriptor gets a POLLPRI event when the tasks are stalled
+        for more than pressure_threshold microseconds in a window of
+        pressure_window microseconds (and POLLERR if the trigger is
+        destroyed). None is returned if triggers aren't supported, so the
+        test is polled instead.
+        """
+        if self._trigger is not None or self._trigger_failed:
+            return self._trigger
+
+        trigger = "{} {} {}".format(
+            self.config["pressure_kind"],
+            self.config["pressure_threshold"],
+            self.config["pressure_window"],
+        )
+        try:
+            fd = os.open(self.path, os.O_RDWR | os.O_NONBLOCK)
+        except OSError as error:
+            logger.info("Could not open %s (%s), polling it instead",
+                        self.path, error)
+            self._trigger_failed = True
+            return None
+        try:
+            os.write(fd, trigger.encode() + b"\0")
+        except OSError as error:
+            os.close(fd)
+            logger.warning("Could not register the PSI trigger %r on %s "
+                           "(%s), polling it instead", trigger, self.path,
+                           error)
+            self._trigger_failed = True
+            return None
+
+        logger.debug("PSI trigger registered on %s: %s", self.path, trigger)
+        self._trigger = fd
+        return fd
+
+    def settled(self, result):
+        """Check if a result is below the level of the PSI trigger.
+
+        The level is the share of the window (in percent) the tasks must be
+        stalled for the trigger to fire. While the result is above it, the
+        test is polled, it waits for the trigger again once it's below.
+        """
+        level = self.config["pressure_threshold"] / \
+            self.config["pressure_window"] * 100
+        return result < level
+
+    def unwatch(self):
+        """Remove the PSI trigger (the test is polled from now on)."""
+        self.close()
+        self._trigger_failed = True
+
+    def close(self):
+        """Remove the PSI trigger."""
+        if self._trigger is not None:
+            os.close(self._trigger)
+            self._trigger = None
@@ -0,0 +1,59 @@
+"""Health Check - A simple health check script for your server."""
+
+# This file is part of the healthcheck package.
+#
+# The healthcheck package is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# The healthcheck package is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# the healthcheck package.  If not, see <http://www.gnu.org/licenses/>.
+
+# Standard library imports
+import logging
+
+# Import the shared system data
+import healthcheck.snapshot
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Values that the test can return
+METRICS = ("processes", "zombies", "threads")
+
+
+class Test:
+    """Test class that checks the number of processes, zombies or threads."""
+
+    def __init__(self, config):
+        """Initialize the test."""
+        self.config = config
+        logger.debug("Initializing test: %s", __name__)
+
+    def run(self, snapshot=None):
+        """Run the test."""
+        logger.debug("Running test: %s", __name__)
+
+        # Read the system data if it's not shared by the test manager
+        if snapshot is None:
+            snapshot = healthcheck.snapshot.Snapshot()
+
+        # Get the metric to return
+        metric = self.config["processes_metric"]
+        if metric not in METRICS:
+            logger.error("Invalid processes metric: %s", metric)
+            return False
+
+        # Count the processes (the process states are only read to count
+        # the zombies)
+        counts = snapshot.process_counts(states=metric == "zombies",
+                                         owners=False)
+
+        # Return the count
+        return getattr(counts, metric)
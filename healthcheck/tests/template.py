@@ -30,10 +30,14 @@ class Test:
         self.config = config
         logger.debug("Initializing test: %s", __name__)
 
-    def run(self):
+    def run(self, snapshot=None):
         """Run the test."""
         logger.debug("Running test: %s", __name__)
 
+        # The system data (psutil values) shared by the tests run at the
+        # same time is available in snapshot (healthcheck.snapshot.Snapshot,
+        # None if the test isn't run by the test manager)
+
         # Return False to indicate failure
         # Return a value to indicate success, this value will be used in the
         # score calculation
@@ -0,0 +1,61 @@
+"""Health Check - A simple health check script for your server."""
+
+# This file is part of the healthcheck package.
+#
+# The healthcheck package is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# The healthcheck package is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# the healthcheck package.  If not, see <http://www.gnu.org/licenses/>.
+
+# Standard library imports
+import logging
+
+# Import the shared system data
+import healthcheck.snapshot
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Values that the test can return
+METRICS = ("max_processes", "users")
+
+
+class Test:
+    """Test class that checks the processes of the users."""
+
+    def __init__(self, config):
+        """Initialize the test."""
+        self.config = config
+        logger.debug("Initializing test: %s", __name__)
+
+    def run(self, snapshot=None):
+        """Run the test."""
+        logger.debug("Running test: %s", __name__)
+
+        # Read the system data if it's not shared by the test manager
+        if snapshot is None:
+            snapshot = healthcheck.snapshot.Snapshot()
+
+        # Get the metric to return
+        metric = self.config["users_metric"]
+        if metric not in METRICS:
+            logger.error("Invalid users metric: %s", metric)
+            return False
+
+        # Count the processes of each user
+        users = snapshot.process_counts(states=False, owners=True).users
+
+        # Return the number of users that have processes
+        if metric == "users":
+            return len(users)
+
+        # Return the number of processes of the user that has the most
+        return max(users.values(), default=0)
@@ -0,0 +1,126 @@
+"""Tests of the endpoint check."""
+
+# This file is part of the healthcheck package.
+#
+# The healthcheck package is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# The healthcheck package is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# the healthcheck package.  If not, see <http://www.gnu.org/licenses/>.
+
+# Run from the root of the repository:
+#   python3 -m unittest discover tests
+
+# Standard library imports
+import http.server
+import os
+import socket
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import healthcheck modules
+import healthcheck.tests.endpoint  # noqa: E402
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    """HTTP/1.1 handler: /error answers 500, the other paths answer 200."""
+
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        """Count the connections."""
+        super().setup()
+        self.server.connections += 1
+
+    def do_GET(self):
+        """Answer a request (the connection is kept alive)."""
+        status = 500 if self.path == "/error" else 200
+        body = b"ok\n"
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """Don't log the requests."""
+
+
+class EndpointTest(unittest.TestCase):
+    """Test the endpoint check against a local HTTP server."""
+
+    def setUp(self):
+        """Start the HTTP server."""
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0),
+                                                      Handler)
+        self.server.daemon_threads = True
+        self.server.connections = 0
+        threading.Thread(target=self.server.serve_forever,
+                         daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.tests = []
+
+    def tearDown(self):
+        """Stop the HTTP server, and close the connections of the tests."""
+        for test in self.tests:
+            test.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def make_test(self, endpoints):
+        """Create an endpoint test (closed by tearDown)."""
+        test = healthcheck.tests.endpoint.Test({
+            "endpoints": endpoints,
+            "endpoint_timeout": 2,
+        })
+        self.tests.append(test)
+        return test
+
+    def test_keep_alive(self):
+        """The connection is reused by the next runs."""
+        endpoint = self.url + "/health"
+        test = self.make_test([endpoint])
+        for _ in range(3):
+            latency = test.run()[endpoint]
+            self.assertLess(latency, 2000)
+        self.assertEqual(self.server.connections, 1)
+
+    def test_http_error(self):
+        """An HTTP error gets the timeout as latency."""
+        endpoint = self.url + "/error"
+        test = self.make_test([endpoint, self.url + "/health"])
+        with self.assertLogs(healthcheck.tests.endpoint.logger, "WARNING"):
+            results = test.run()
+        self.assertEqual(results[endpoint], 2000)
+        self.assertLess(results[self.url + "/health"], 2000)
+        # The connection is still reused after an error
+        with self.assertLogs(healthcheck.tests.endpoint.logger, "WARNING"):
+            self.assertEqual(test.run()[endpoint], 2000)
+        self.assertEqual(self.server.connections, 2)
+
+    def test_refused(self):
+        """A refused TCP port gets the timeout as latency."""
+        # Get a port that nothing listens on
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        refused = f"tcp://127.0.0.1:{port}"
+        listening = f"tcp://127.0.0.1:{self.server.server_address[1]}"
+        test = self.make_test([refused, listening])
+        with self.assertLogs(healthcheck.tests.endpoint.logger, "WARNING"):
+            results = test.run()
+        self.assertEqual(results[refused], 2000)
+        self.assertLess(results[listening], 2000)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,158 @@
+"""Tests of the history of the results."""
+
+# This file is part of the healthcheck package.
+#
+# The healthcheck package is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# The healthcheck package is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# the healthcheck package.  If not, see <http://www.gnu.org/licenses/>.
+
+# Run from the root of the repository:
+#   python3 -m unittest discover tests
+
+# Standard library imports
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import healthcheck modules
+import healthcheck.history  # noqa: E402
+
+
+class RingBufferTest(unittest.TestCase):
+    """Test the ring buffer, in memory and in a buffer."""
+
+    def test_wrap(self):
+        """The oldest records are dropped when the ring buffer is full."""
+        ring = healthcheck.history.RingBuffer(2, 4)
+        for timestamp in range(10):
+            ring.append(timestamp, timestamp * 2)
+        self.assertEqual(len(ring), 4)
+        self.assertEqual(ring.record(0), (6, 12))
+        self.assertEqual(ring.record(-1), (9, 18))
+        self.assertEqual(ring.range(7, 8), [(7, 14), (8, 16)])
+        self.assertEqual(ring.range(0, 5), [])
+        self.assertEqual(ring.bisect(100), 4)
+
+    def test_buffer(self):
+        """The records are loaded back from the buffer."""
+        size = healthcheck.history.RingBuffer.size(2, 4)
+        buffer = bytearray(size + 8)
+        ring = healthcheck.history.RingBuffer(2, 4, buffer, 8)
+        for timestamp in range(6):
+            ring.append(timestamp, -timestamp)
+        ring.update_last(5, 42)
+
+        loaded = healthcheck.history.RingBuffer(2, 4, buffer, 8)
+        self.assertEqual(len(loaded), 4)
+        self.assertEqual(loaded.range(0, 10),
+                         [(2, -2), (3, -3), (4, -4), (5, 42)])
+
+
+class CheckHistoryTest(unittest.TestCase):
+    """Test the rollups of a check history."""
+
+    def test_rollups(self):
+        """The results are summarized in buckets."""
+        history = healthcheck.history.CheckHistory(4, [(10, 4)])
+        for timestamp, value in enumerate([1, 5, 3, 7, 2, 8]):
+            history.append(100 + timestamp * 3, value)
+
+        # The raw results don't cover the range anymore
+        resolution, points = history.query(100, 115)
+        self.assertEqual(resolution, 10)
+        self.assertEqual(points, [(100, 1, 7, 4, 7), (110, 2, 8, 5, 8)])
+
+        # The raw results cover the end of the range
+        resolution, points = history.query(110, 115)
+        self.assertEqual(resolution, 0)
+        self.assertEqual(points, [(112, 2, 2, 2, 2), (115, 8, 8, 8, 8)])
+
+
+class HistoryTest(unittest.TestCase):
+    """Test the history file."""
+
+    def setUp(self):
+        """Create a temporary directory for the history file."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "history")
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        self.directory.cleanup()
+
+    def open(self, **kwargs):
+        """Open the history file."""
+        return healthcheck.history.History(self.path, capacity=8,
+                                           max_checks=4,
+                                           rollups=((60, 4),), **kwargs)
+
+    def test_reload(self):
+        """The results are loaded back after a restart."""
+        history = self.open()
+        history.append("cpu", 10, 1)
+        history.append("cpu", 20, 2)
+        history.close()
+
+        history = self.open()
+        self.assertEqual(history.query("cpu", 0, 30), [(10, 1), (20, 2)])
+        history.close()
+
+    def test_long_names(self):
+        """Long names are matched exactly after a restart."""
+        name = "cgroups./system.slice/" + "x" * 60 + ":memory"
+        history = self.open()
+        history.append(name, 10, 1, "cgroups")
+        history.append(name[:-1], 10, 2, "cgroups")
+        history.close()
+
+        history = self.open()
+        history.append(name, 20, 3, "cgroups")
+        self.assertEqual(len(history.checks), 2)
+        self.assertEqual(history.query(name, 0, 30), [(10, 1), (20, 3)])
+        self.assertEqual(history.query(name[:-1], 0, 30), [(10, 2)])
+        history.close()
+
+    def test_retain(self):
+        """The slots of the removed checks (and of their metrics) are freed."""
+        history = self.open()
+        history.append("cpu", 10, 1)
+        history.append("cgroups.a", 10, 2, "cgroups")
+        history.append("cgroups.b", 10, 3, "cgroups")
+        history.append("ram", 10, 4)
+        history.retain(["cpu", "ram"])
+        self.assertEqual(len(history.checks), 2)
+        history.close()
+
+        # The freed slots are reused after a restart
+        history = self.open()
+        self.assertEqual(history.query("cgroups.a", 0, 30), [])
+        self.assertEqual(history.query("ram", 0, 30), [(10, 4)])
+        for name in ("disk", "load"):
+            history.append(name, 10, 5)
+        self.assertEqual(len(history.checks), 4)
+        history.close()
+
+    def test_full(self):
+        """The checks that don't fit are not recorded."""
+        history = self.open()
+        for index in range(6):
+            history.append(f"check{index}", 10, index)
+        self.assertEqual(len(history.checks), 4)
+        self.assertEqual(history.query("check5", 0, 30), [])
+        history.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,135 @@
+"""Tests of the score publication in shared memory."""
+
+# This file is part of the healthcheck package.
+#
+# The healthcheck package is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# The healthcheck package is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# the healthcheck package.  If not, see <http://www.gnu.org/licenses/>.
+
+# Run from the root of the repository:
+#   python3 -m unittest discover tests
+
+# Standard library imports
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import healthcheck modules
+import healthcheck.publish  # noqa: E402
+
+
+class PublishTest(unittest.TestCase):
+    """Test the publisher and the reader."""
+
+    def setUp(self):
+        """Create a temporary directory for the score file."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "healthcheck.score")
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        self.directory.cleanup()
+
+    def test_read(self):
+        """The published scores are read back."""
+        publisher = healthcheck.publish.Publisher(self.path, capacity=4)
+        self.assertEqual(healthcheck.publish.read(self.path),
+                         {"score": None, "timestamp": 0, "checks": {}})
+
+        publisher.publish(42.5, {"cpu": (10, 100), "ram": (20, 101)}, 102)
+        self.assertEqual(healthcheck.publish.read(self.path), {
+            "score": 42.5,
+            "timestamp": 102,
+            "checks": {"cpu": (10, 100), "ram": (20, 101)},
+        })
+
+        # The file is removed when the publisher is closed
+        publisher.close()
+        self.assertIsNone(healthcheck.publish.read(self.path))
+
+    def test_long_names(self):
+        """Long names that only differ at the end stay unique."""
+        publisher = healthcheck.publish.Publisher(self.path, capacity=4)
+        names = ["cgroups./system.slice/" + "x" * 60 + suffix
+                 for suffix in (":cpu", ":io", ":memory")]
+        publisher.publish(1, {name: (index, 0)
+                              for index, name in enumerate(names)}, 1)
+        checks = healthcheck.publish.read(self.path)["checks"]
+        self.assertEqual(len(checks), 3)
+        for index, name in enumerate(names):
+            entry = healthcheck.publish.entry_name(name)
+            self.assertLessEqual(len(entry.encode()),
+                                 healthcheck.publish.NAME_SIZE)
+            self.assertEqual(checks[entry], (index, 0))
+        self.assertEqual(healthcheck.publish.entry_name("cpu"), "cpu")
+        publisher.close()
+
+    def test_symlink(self):
+        """A symbolic link planted at the path is refused."""
+        target = os.path.join(self.directory.name, "target")
+        with open(target, "w") as file:
+            file.write("data")
+        os.symlink(target, self.path)
+        with self.assertRaises(OSError):
+            healthcheck.publish.Publisher(self.path)
+        with open(target) as file:
+            self.assertEqual(file.read(), "data")
+
+    def test_in_progress(self):
+        """An update in progress is not read."""
+        publisher = healthcheck.publish.Publisher(self.path, capacity=4)
+        publisher.publish(1, {}, 1)
+        healthcheck.publish.SEQUENCE.pack_into(
+            publisher._mmap, healthcheck.publish.SEQUENCE_OFFSET,
+            publisher._sequence + 1,
+        )
+        self.assertIsNone(healthcheck.publish.read(self.path))
+        publisher.close()
+
+    def test_concurrent(self):
+        """The reader never sees a partial update."""
+        publisher = healthcheck.publish.Publisher(self.path, capacity=8)
+        stop = threading.Event()
+
+        def write():
+            """Publish updates where all the scores are the same."""
+            index = 0
+            while not stop.is_set():
+                index += 1
+                publisher.publish(index, {
+                    f"check{check}": (index, index) for check in range(8)
+                }, index)
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        try:
+            for _ in range(2000):
+                published = healthcheck.publish.read(self.path)
+                if published is None:
+                    continue
+                scores = {score for score, _ in
+                          published["checks"].values()}
+                self.assertLessEqual(len(scores), 1)
+                if scores:
+                    self.assertEqual(scores, {published["score"]})
+        finally:
+            stop.set()
+            writer.join()
+        publisher.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+"""Tests of the check scheduler."""
+
+# This file is part of the healthcheck package.
+#
+# The healthcheck package is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# The healthcheck package is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# the healthcheck package.  If not, see <http://www.gnu.org/licenses/>.
+
+# Run from the root of the repository:
+#   python3 -m unittest discover tests
+
+# Standard library imports
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import healthcheck modules
+import healthcheck.scheduler  # noqa: E402
+
+
+def off_grid(run_at, offset, grid):
+    """Get the distance between a deadline and the nearest grid point."""
+    remainder = (run_at - offset) % grid
+    return min(remainder, grid - remainder)
+
+
+class SchedulerTest(unittest.TestCase):
+    """Test the heap of deadlines."""
+
+    def test_pop_due(self):
+        """The due checks are popped nearest first."""
+        scheduler = healthcheck.scheduler.Scheduler("host")
+        scheduler.schedule("b", 20)
+        scheduler.schedule("a", 10)
+        scheduler.schedule("c", 30)
+        self.assertEqual(scheduler.next_run_at(), 10)
+        self.assertEqual(scheduler.pop_due(25), ["a", "b"])
+        self.assertEqual(len(scheduler), 1)
+        self.assertEqual(scheduler.pop_due(25), [])
+        self.assertEqual(scheduler.next_run_at(), 30)
+
+    def test_reschedule(self):
+        """A check rescheduled or cancelled only keeps its last deadline."""
+        scheduler = healthcheck.scheduler.Scheduler("host")
+        scheduler.schedule("a", 10)
+        scheduler.schedule("b", 15)
+        scheduler.schedule("a", 40)
+        scheduler.cancel("b")
+        self.assertNotIn("b", scheduler)
+        self.assertEqual(scheduler.next_run_at(), 40)
+        self.assertEqual(scheduler.pop_due(50), ["a"])
+        self.assertIsNone(scheduler.next_run_at())
+
+
+class SpreadTest(unittest.TestCase):
+    """Test the deadlines on the grid of the check interval."""
+
+    def test_phase(self):
+        """The phase is stable for a seed, and different between seeds."""
+        first = healthcheck.scheduler.Scheduler("host")
+        second = healthcheck.scheduler.Scheduler("host")
+        other = healthcheck.scheduler.Scheduler("other")
+        self.assertEqual(first.phase("cpu"), second.phase("cpu"))
+        self.assertNotEqual(first.phase("cpu"), other.phase("cpu"))
+        self.assertTrue(0 <= first.phase("cpu") < 1)
+
+    def test_on_grid(self):
+        """The deadlines stay on the grid, one interval apart."""
+        scheduler = healthcheck.scheduler.Scheduler("host")
+        offset = scheduler.phase("cpu") * 10
+        now = 1000.0
+        run_at = scheduler.next_run_at_spread("cpu", now, 10, 10)
+        self.assertTrue(now + 10 <= run_at < now + 20)
+        for _ in range(100):
+            scheduler.schedule("cpu", run_at)
+            self.assertEqual(scheduler.pop_due(run_at), ["cpu"])
+            # The check is run a bit late
+            next_run_at = scheduler.next_run_at_spread("cpu", run_at + 0.5,
+                                                       10, 10)
+            self.assertAlmostEqual(next_run_at - run_at, 10)
+            self.assertAlmostEqual(off_grid(next_run_at, offset, 10), 0)
+            run_at = next_run_at
+
+    def test_longer_interval(self):
+        """A backoff interval is respected, and stays on the grid."""
+        scheduler = healthcheck.scheduler.Scheduler("host")
+        offset = scheduler.phase("cpu") * 10
+        run_at = scheduler.next_run_at_spread("cpu", 1000.0, 10, 10)
+        for interval in (15, 20, 40, 80):
+            scheduler.schedule("cpu", run_at)
+            scheduler.pop_due(run_at)
+            next_run_at = scheduler.next_run_at_spread("cpu", run_at + 1,
+                                                       interval, 10)
+            self.assertTrue(interval <= next_run_at - run_at < interval + 10)
+            self.assertAlmostEqual(off_grid(next_run_at, offset, 10), 0)
+            run_at = next_run_at
+
+    def test_shorter_interval(self):
+        """An interval shorter than the grid (adaptive) is respected."""
+        scheduler = healthcheck.scheduler.Scheduler("host")
+        run_at = scheduler.next_run_at_spread("cpu", 1000.0, 10, 10)
+        for interval in (5, 7.5, 2.5):
+            scheduler.schedule("cpu", run_at)
+            scheduler.pop_due(run_at)
+            run_at = scheduler.next_run_at_spread("cpu", run_at, interval,
+                                                  10)
+            # After the first run at the new interval, the check is run at
+            # this interval exactly
+            for _ in range(10):
+                scheduler.schedule("cpu", run_at)
+                scheduler.pop_due(run_at)
+                next_run_at = scheduler.next_run_at_spread(
+                    "cpu", run_at + 0.1, interval, 10
+                )
+                self.assertAlmostEqual(next_run_at - run_at, interval)
+                run_at = next_run_at
+
+    def test_run_early(self):
+        """A check run before its deadline waits an interval from now."""
+        scheduler = healthcheck.scheduler.Scheduler("host")
+        scheduler.schedule("cpu", 2000.0)
+        run_at = scheduler.next_run_at_spread("cpu", 1000.0, 10, 10)
+        self.assertTrue(1010 <= run_at < 1020)
+
+
+if __name__ == "__main__":
+    unittest.main()
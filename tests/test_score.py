@@ -0,0 +1,139 @@
+"""Tests of the incremental score calculation."""
+
+# This file is part of the healthcheck package.
+#
+# The healthcheck package is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# The healthcheck package is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# the healthcheck package.  If not, see <http://www.gnu.org/licenses/>.
+
+# Run from the root of the repository:
+#   python3 -m unittest discover tests
+
+# Standard library imports
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import healthcheck modules
+import healthcheck.score  # noqa: E402
+
+CONFIG = {"global": {"score": {"min": 0, "max": 100,
+                               "lower_is_better": False}}}
+
+
+def reference_score(score_list, config):
+    """Calculate the score like the original (non incremental) version."""
+    # Move the ignore_if_up_average tests at the end of the list
+    ordered = [
+        value for value in score_list.values()
+        if not value["config"]["ignore_if_up_average"]
+    ] + [
+        value for value in score_list.values()
+        if value["config"]["ignore_if_up_average"]
+    ]
+
+    score = 0
+    total_coefficients = 0
+    for value in ordered:
+        percentage = (value["score"] - value["config"]["min"]) / \
+            (value["config"]["max"] - value["config"]["min"]) * 100
+        percentage = max(0, min(100, percentage))
+        coefficient = value["config"]["coeff"]
+        if value["config"]["ignore_if_up_average"] and total_coefficients:
+            actual_average = score / total_coefficients
+            average_with_current_test = (score + percentage * coefficient) / \
+                (total_coefficients + coefficient)
+            if average_with_current_test < actual_average:
+                continue
+        score += percentage * coefficient
+        total_coefficients += coefficient
+
+    if not total_coefficients:
+        return None
+    return healthcheck.score._global_score(score / total_coefficients, config)
+
+
+def random_entry(generator):
+    """Get a random test data entry."""
+    return {
+        "score": generator.uniform(-50, 150),
+        "config": {
+            "min": 0,
+            "max": generator.choice([1, 7.3, 10, 100]),
+            "coeff": generator.uniform(0.1, 5),
+            "ignore_if_up_average": generator.random() < 0.2,
+        },
+    }
+
+
+class ScoreEngineTest(unittest.TestCase):
+    """Compare the incremental score with the full calculation."""
+
+    def test_random_updates(self):
+        """The score is exactly the same after any sequence of updates."""
+        for seed in range(50):
+            generator = random.Random(seed)
+            engine = healthcheck.score.ScoreEngine(CONFIG)
+            test_data = {}
+            for _ in range(200):
+                name = f"test{generator.randrange(20)}"
+                if generator.random() < 0.1:
+                    if test_data.pop(name, None) is not None:
+                        engine.remove(name)
+                else:
+                    test_data[name] = random_entry(generator)
+                    engine.update(name, test_data[name])
+                expected = reference_score(test_data, CONFIG)
+                self.assertEqual(engine.score(), expected)
+                self.assertEqual(
+                    healthcheck.score.calculate(test_data, CONFIG)
+                    if test_data else None,
+                    expected,
+                )
+
+    def test_cached(self):
+        """The score is only computed again when a test changed."""
+        engine = healthcheck.score.ScoreEngine(CONFIG)
+        entry = random_entry(random.Random(0))
+        entry["config"]["ignore_if_up_average"] = False
+        engine.update("test", entry)
+        score = engine.score()
+        self.assertFalse(engine._dirty)
+
+        # Same result: still clean
+        engine.update("test", entry)
+        self.assertFalse(engine._dirty)
+        self.assertEqual(engine.score(), score)
+
+        # Removed test: no score anymore
+        engine.remove("test")
+        self.assertTrue(engine._dirty)
+        self.assertIsNone(engine.score())
+
+    def test_lower_is_better(self):
+        """The score is reversed if lower is not better."""
+        config = {"global": {"score": {"min": 0, "max": 100,
+                                       "lower_is_better": True}}}
+        entry = {"score": 25, "config": {"min": 0, "max": 100, "coeff": 1,
+                                         "ignore_if_up_average": False}}
+        engine = healthcheck.score.ScoreEngine(config)
+        engine.update("test", entry)
+        self.assertEqual(engine.score(), 25)
+        engine.set_config(CONFIG)
+        self.assertEqual(engine.score(), 75)
+
+
+if __name__ == "__main__":
+    unittest.main()